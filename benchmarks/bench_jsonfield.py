@@ -0,0 +1,103 @@
+#!/usr/bin/env python
+# benchmarks/bench_jsonfield.py
+# author: andrew young
+# email: ayoung@thewulf.org
+"""
+loads `--rows` rows carrying a large JSON column and times reading them with and
+without touching the json, against the eager behaviour of decoding every row.
+
+    python benchmarks/bench_jsonfield.py --rows 1000000 --keys 200
+"""
+from __future__ import print_function
+
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), os.pardir))
+
+import django
+from django.conf import settings
+
+DB_PATH = os.path.join(tempfile.gettempdir(), "elasticmodels_bench_jsonfield.db")
+
+settings.configure(
+    DATABASES={"default": {"ENGINE": "django.db.backends.sqlite3", "NAME": DB_PATH}},
+    INSTALLED_APPS=["elasticmodels"],
+    ES_AUTO_SYNC=False,
+)
+django.setup()
+
+from django.db import connection, models
+
+from elasticmodels.utils.fields import JSONField
+
+
+class Report(models.Model):
+    class Meta:
+        app_label = "elasticmodels"
+
+    name = models.CharField(max_length=50)
+    payload = JSONField(default=dict)
+
+
+def timed(label, func):
+    start = time.time()
+    func()
+    elapsed = time.time() - start
+    print("{0:<40} {1:>8.2f}s".format(label, elapsed))
+    return elapsed
+
+
+def populate(rows, keys):
+    payload = json.dumps({"key_{0}".format(i): "value " * 10 for i in range(keys)})
+    with connection.schema_editor() as editor:
+        editor.create_model(Report)
+    with connection.cursor() as cursor:
+        batch = 10000
+        for start in range(0, rows, batch):
+            cursor.executemany(
+                "INSERT INTO {0} (name, payload) VALUES (%s, %s)".format(
+                    Report._meta.db_table),
+                [("row {0}".format(i), payload) for i in
+                    range(start, min(start + batch, rows))])
+    return len(payload)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=1000000)
+    parser.add_argument("--keys", type=int, default=200)
+    options = parser.parse_args()
+
+    if os.path.exists(DB_PATH):
+        os.remove(DB_PATH)
+    try:
+        size = populate(options.rows, options.keys)
+        print("{0} rows, {1} bytes of json per row".format(options.rows, size))
+
+        queryset = Report.objects.all()
+        untouched = timed("load, json untouched (lazy)",
+            lambda: [report.name for report in queryset.iterator()])
+        touched = timed("load, json read (lazy)",
+            lambda: [report.payload for report in queryset.iterator()])
+        eager = timed("load, json.loads every row (eager)",
+            lambda: [(report.name, json.loads(raw)) for report, raw in
+                ((report, report.__dict__["payload"].raw) for report in
+                    queryset.iterator())])
+        timed("save untouched rows (no re-encode)",
+            lambda: [report.save(update_fields=["payload"]) for report in
+                queryset[:min(options.rows, 10000)]])
+
+        print("lazy untouched vs eager: {0:.1f}x faster".format(eager / untouched))
+        print("lazy read vs eager:      {0:.1f}x".format(eager / touched))
+    finally:
+        if os.path.exists(DB_PATH):
+            os.remove(DB_PATH)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,141 @@
+#!/usr/bin/env python
+# benchmarks/bench_payload.py
+# author: andrew young
+# email: ayoung@thewulf.org
+"""
+serializes `--rows` sparse rows through the bulk path and counts the bytes of the
+`_bulk` request bodies, as is, with the payload minimization options, and
+gzipped at several levels.
+
+    python benchmarks/bench_payload.py --rows 100000
+"""
+from __future__ import print_function
+
+import argparse
+import gzip
+import io
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), os.pardir))
+
+import django
+from django.conf import settings
+
+DB_PATH = os.path.join(tempfile.gettempdir(), "elasticmodels_bench_payload.db")
+
+settings.configure(
+    DATABASES={"default": {"ENGINE": "django.db.backends.sqlite3", "NAME": DB_PATH}},
+    INSTALLED_APPS=["elasticmodels"],
+    ES_AUTO_SYNC=False,
+)
+django.setup()
+
+from django.db import connection, models
+
+from elasticsearch.helpers import expand_action
+from elasticsearch.serializer import JSONSerializer
+
+from elasticmodels.models import SearchableModel
+from elasticmodels.utils.bulk import ChunkSerializer
+
+
+class Listing(SearchableModel):
+    class Meta:
+        app_label = "elasticmodels"
+
+    title = models.CharField(max_length=100)
+    subtitle = models.CharField(max_length=100, blank=True)
+    description = models.TextField(blank=True)
+    price = models.FloatField(null=True)
+    category = models.CharField(max_length=50, null=True)
+
+
+class CompactListing(SearchableModel):
+    class Meta:
+        app_label = "elasticmodels"
+
+    class MappingMeta:
+        strip_empty = True
+        truncate_fields = {"description": 200}
+        additional_options = {"description": {"index": "no"}}
+
+    title = models.CharField(max_length=100)
+    subtitle = models.CharField(max_length=100, blank=True)
+    description = models.TextField(blank=True)
+    price = models.FloatField(null=True)
+    category = models.CharField(max_length=50, null=True)
+
+
+def populate(rows):
+    for model in (Listing, CompactListing):
+        with connection.schema_editor() as editor:
+            editor.create_model(model)
+        # mostly sparse rows, every tenth one is complete with a long description
+        model.objects.bulk_create([model(title="listing {0}".format(i),
+            subtitle="" if i % 10 else "a subtitle",
+            description="" if i % 10 else "lorem ipsum " * 200,
+            price=None if i % 10 else i * 1.5,
+            category=None if i % 10 else "category") for i in range(rows)],
+            batch_size=5000)
+
+
+def bulk_bodies(model):
+    """ the `_bulk` request bodies elasticsearch-py would send for `model`
+    """
+    serializer = JSONSerializer()
+    for chunk in ChunkSerializer(model.objects.all(), op_type="index",
+            chunk_size=500):
+        lines = []
+        for action in chunk:
+            for line in expand_action(dict(action)):
+                if line is not None:
+                    lines.append(line if isinstance(line, str) else
+                        serializer.dumps(line))
+        yield ("\n".join(lines) + "\n").encode("utf-8")
+
+
+def gzipped_size(body, level):
+    buf = io.BytesIO()
+    with gzip.GzipFile(fileobj=buf, mode="wb", compresslevel=level) as compressed:
+        compressed.write(body)
+    return len(buf.getvalue())
+
+
+def measure(label, model, levels):
+    start = time.time()
+    bodies = list(bulk_bodies(model))
+    elapsed = time.time() - start
+    raw = sum(len(body) for body in bodies)
+    print("{0:<28} {1:>14,} bytes {2:>8.2f}s".format(label, raw, elapsed))
+    for level in levels:
+        start = time.time()
+        size = sum(gzipped_size(body, level) for body in bodies)
+        print("{0:<28} {1:>14,} bytes {2:>8.2f}s  ({3:.1f}x)".format(
+            "  gzip level {0}".format(level), size, time.time() - start,
+            raw / float(size)))
+    return raw
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=100000)
+    parser.add_argument("--levels", type=int, nargs="+", default=[1, 6, 9])
+    options = parser.parse_args()
+
+    if os.path.exists(DB_PATH):
+        os.remove(DB_PATH)
+    try:
+        populate(options.rows)
+        full = measure("full documents", Listing, options.levels)
+        compact = measure("strip_empty + truncate", CompactListing, options.levels)
+        print("minimization alone: {0:.1f}x smaller".format(full / float(compact)))
+    finally:
+        if os.path.exists(DB_PATH):
+            os.remove(DB_PATH)
+
+
+if __name__ == "__main__":
+    main()
@@ -2,24 +2,59 @@
 # author: andrew young
 # email: ayoung@thewulf.org
 
+import threading
 import warnings
 
 from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
 
 from elasticsearch import Elasticsearch
 
 
 es_hosts = getattr(settings, "ES_HOSTS", ["localhost:9200"])
 
+# named connections, each a dict of keyword arguments for `Elasticsearch`, ie
+# {"default": {"hosts": [...]}, "ingest": {"hosts": [...]}, "query": {...}}
+es_connections = getattr(settings, "ES_CONNECTIONS", {"default": {"hosts": es_hosts}})
+
+_clients = {}
+_clients_lock = threading.Lock()
+
 
 def connect(hosts=None, **kwargs):
+    """ a new client. with a `compresslevel` (`ES_GZIP_LEVEL` by default) the
+    request bodies are gzipped, see `elasticmodels.connection.GzipConnection`
+    """
     assert isinstance(hosts, (list, tuple, type(None))), \
         "`hosts` attribute must be list or tuple."
     if not hosts:
         hosts = es_hosts
+    compresslevel = kwargs.pop("compresslevel", getattr(settings, "ES_GZIP_LEVEL",
+        None))
+    if compresslevel:
+        from elasticmodels.connection import GzipConnection
+        kwargs.setdefault("connection_class", GzipConnection)
+        kwargs["compresslevel"] = compresslevel
     return Elasticsearch(hosts, **kwargs)
 
 
+def get_connection(using=None):
+    """ the shared client for the `ES_CONNECTIONS` entry named `using`, "default"
+    when None.
+    """
+    using = using or "default"
+    if using not in _clients:
+        with _clients_lock:
+            if using not in _clients:
+                try:
+                    options = dict(es_connections[using])
+                except KeyError:
+                    raise ImproperlyConfigured("{0} is not defined in "
+                        "ES_CONNECTIONS".format(using))
+                _clients[using] = connect(options.pop("hosts", None), **options)
+    return _clients[using]
+
+
 def check_connection(elasticsearch=None):
     """ if check connection returns True then the host is valid and elasticsearch is
     ready to party.
@@ -0,0 +1,27 @@
+# elasticmodels/connection.py
+# author: andrew young
+# email: ayoung@thewulf.org
+
+import gzip
+import io
+
+from elasticsearch.connection import Urllib3HttpConnection
+
+
+class GzipConnection(Urllib3HttpConnection):
+    """ gzips every request body (bulk, search, ...) at `compresslevel`, 1 is the
+    fastest and 9 the smallest, and accepts gzipped responses. enabled for every
+    connection with `ES_GZIP_LEVEL`, or per `ES_CONNECTIONS` entry:
+    >>> ES_CONNECTIONS = {"default": {"hosts": [...], "compresslevel": 6}}
+    """
+    def __init__(self, compresslevel=6, **kwargs):
+        kwargs["http_compress"] = True
+        self.compresslevel = compresslevel
+        super(GzipConnection, self).__init__(**kwargs)
+
+    def _gzip_compress(self, body):
+        buf = io.BytesIO()
+        with gzip.GzipFile(fileobj=buf, mode="wb",
+                compresslevel=self.compresslevel) as compressed:
+            compressed.write(body)
+        return buf.getvalue()
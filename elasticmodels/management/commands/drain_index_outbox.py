@@ -0,0 +1,63 @@
+# management/commands/drain_index_outbox.py
+# author: andrew young
+# email: ayoung@thewulf.org
+
+import time
+
+from django.core.management.base import BaseCommand
+
+from elasticmodels.utils.outbox import drain, dead_letters
+
+
+class Command(BaseCommand):
+    """ ships the operations recorded in the index outbox (see `ES_OUTBOX`) to
+    elasticsearch in bulk. several workers can run side by side.
+    """
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size",
+            dest="batch_size",
+            default=500,
+            type=int,
+            help="the number of outbox rows claimed per transaction.")
+        parser.add_argument(
+            "--interval",
+            dest="interval",
+            default=1.0,
+            type=float,
+            help="seconds to sleep whenever the outbox is empty.")
+        parser.add_argument(
+            "--once",
+            dest="once",
+            default=False,
+            action="store_true",
+            help="exit once the outbox is empty instead of polling it.")
+        parser.add_argument(
+            "--database",
+            dest="database",
+            default=None,
+            help="the database holding the outbox.")
+        parser.add_argument(
+            "--retry-failed",
+            dest="retry_failed",
+            default=False,
+            action="store_true",
+            help="claim the dead-lettered rows again, see ES_OUTBOX_MAX_ATTEMPTS.")
+
+    def handle(self, *args, **options):
+        if options["retry_failed"]:
+            retried = dead_letters(using=options["database"]).update(attempts=0)
+            self.stdout.write("retrying {0} dead-lettered rows".format(retried))
+        drained = 0
+        while True:
+            count = drain(batch_size=options["batch_size"],
+                using=options["database"])
+            drained += count
+            if count:
+                continue
+            if options["once"]:
+                break
+            time.sleep(options["interval"])
+        self.stdout.write("processed {0} outbox rows, {1} dead-lettered".format(
+            drained, dead_letters(using=options["database"]).count()))
@@ -0,0 +1,46 @@
+# management/commands/export_index.py
+# author: andrew young
+# email: ayoung@thewulf.org
+
+from django.core.management.base import BaseCommand
+
+from elasticmodels.utils import collect_indices
+from elasticmodels.utils.snapshot import export_alias
+from elasticmodels.options import IndexNotInstalledError
+
+
+class Command(BaseCommand):
+    """ streams every document of an index alias to a (gzipped) NDJSON snapshot
+    """
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "index_name",
+            help="the name of an installed index.")
+        parser.add_argument(
+            "path",
+            help="the snapshot file, gzipped when it ends with .gz")
+        parser.add_argument(
+            "--slices",
+            dest="slices",
+            default=1,
+            type=int,
+            help="read the index with a sliced scroll of this many slices.")
+        parser.add_argument(
+            "--chunk-size",
+            dest="chunk_size",
+            default=500,
+            type=int,
+            help="the number of documents per scroll request.")
+
+    def handle(self, *args, **options):
+        alias = options["index_name"]
+        index = collect_indices(alias)
+
+        if isinstance(index, (list, tuple)):
+            raise IndexNotInstalledError(
+                self.style.ERROR("{0} not installed.".format(alias)))
+
+        count = export_alias(index.elasticsearch, index.alias_name, options["path"],
+            slices=options["slices"], chunk_size=options["chunk_size"])
+        self.stdout.write("exported {0} documents from {1}".format(count, alias))
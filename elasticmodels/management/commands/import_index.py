@@ -0,0 +1,60 @@
+# management/commands/import_index.py
+# author: andrew young
+# email: ayoung@thewulf.org
+
+from django.core.management.base import BaseCommand
+
+from elasticmodels.utils import collect_indices
+from elasticmodels.utils.snapshot import import_snapshot
+from elasticmodels.options import IndexNotInstalledError
+
+
+class Command(BaseCommand):
+    """ bulk loads a snapshot written by `export_index` into an index alias
+    """
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "index_name",
+            help="the name of an installed index.")
+        parser.add_argument(
+            "path",
+            help="the snapshot file, gzipped when it ends with .gz")
+        parser.add_argument(
+            "--new-revision",
+            dest="new_revision",
+            default=False,
+            action="store_true",
+            help="load into a fresh revision of the index and move the alias to it.")
+        parser.add_argument(
+            "--chunk-size",
+            dest="chunk_size",
+            default=500,
+            type=int,
+            help="the number of documents per bulk request.")
+
+    def handle(self, *args, **options):
+        alias = options["index_name"]
+        index = collect_indices(alias)
+
+        if isinstance(index, (list, tuple)):
+            raise IndexNotInstalledError(
+                self.style.ERROR("{0} not installed.".format(alias)))
+
+        old_name = index._get_current_index_name()
+        if options["new_revision"]:
+            mappings = {name: model._search_meta.mapping for name, model in
+                index.doctypes.items()}
+            target = index._compose_next_index(mappings, index.settings)
+        else:
+            target = old_name
+
+        with index.bulk_load(target):
+            count = import_snapshot(index.elasticsearch, options["path"], target,
+                chunk_size=options["chunk_size"])
+
+        if target != old_name:
+            index._put_alias(target)
+            index._delete_alias(old_name)
+
+        self.stdout.write("imported {0} documents into {1}".format(count, target))
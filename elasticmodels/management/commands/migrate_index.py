@@ -1,11 +1,11 @@
-# managment/commands/migrate_index.py
+# management/commands/migrate_index.py
 # author: andrew young
 # email: ayoung@thewulf.org
 
 from django.core.management.base import BaseCommand
 
 from elasticmodels.utils import collect_indices
-from elasticmodels.exceptions import IndexNotInstalledError
+from elasticmodels.options import IndexNotInstalledError
 
 
 class Command(BaseCommand):
@@ -39,7 +39,6 @@ class Command(BaseCommand):
             raise IndexNotInstalledError(
                 self.style.ERROR("{0} not installed.".format(index)))
 
-        migration = migration_number if migration_number is not None else role_back
-        index.migrate_index(role_back=migration, settings=index.settings,
-            verbose=self.style)
-
+        migration = migration_number if migration_number is not None else \
+            role_back or None
+        index.migrate_index(role_back=migration, settings=index.settings)
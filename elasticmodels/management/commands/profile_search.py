@@ -0,0 +1,61 @@
+# management/commands/profile_search.py
+# author: andrew young
+# email: ayoung@thewulf.org
+
+import json
+
+from django.apps import apps
+from django.core.management.base import BaseCommand
+
+from elasticmodels.utils.profiling import SearchProfile, percentile
+
+
+class Command(BaseCommand):
+    """ runs a search repeatedly and reports where the time went, phase by phase
+    """
+    percentiles = (50, 90, 99)
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "model",
+            help="the searchable model, as app_label.ModelName")
+        parser.add_argument(
+            "query",
+            help="a json file with the search body.")
+        parser.add_argument(
+            "--runs",
+            dest="runs",
+            default=20,
+            type=int,
+            help="how many times to run the search.")
+        parser.add_argument(
+            "--es-profile",
+            dest="es_profile",
+            default=False,
+            action="store_true",
+            help="print the elasticsearch profile api output of the last run.")
+
+    def handle(self, *args, **options):
+        model = apps.get_model(options["model"])
+        with open(options["query"]) as query:
+            body = json.load(query)
+
+        profiles = []
+        for _ in range(options["runs"]):
+            results, raw, profile = model.objects.search_es(body=body, profile=True,
+                es_profile=options["es_profile"])
+            profiles.append(profile)
+
+        header = "{0:<12}".format("phase") + "".join("{0:>10}".format(
+            "p{0}".format(p)) for p in self.percentiles)
+        self.stdout.write(header)
+        for phase in SearchProfile.phases + ("total",):
+            values = [profile.total if phase == "total" else profile.timings[phase]
+                for profile in profiles]
+            self.stdout.write("{0:<12}".format(phase) + "".join(
+                "{0:>8.2f}ms".format(percentile(values, p)) for p in self.percentiles))
+        self.stdout.write("{0} hits, {1} bytes per response".format(
+            len(raw["hits"]["hits"]), profiles[-1].response_bytes))
+
+        if options["es_profile"]:
+            self.stdout.write(json.dumps(profiles[-1].es_profile, indent=2))
@@ -2,35 +2,187 @@
 # author: andrew young
 # email: ayoung@thewulf.org
 
+from functools import partial
+
+from django.conf import settings
 from django.db.models import Manager
+from django.db.models.query import QuerySet
 
+from elasticsearch.exceptions import ConflictError, NotFoundError
 from elasticsearch.helpers import bulk as elasticbulk
 
-from elasticmodels.utils import serializers
+from elasticmodels.utils import outbox, serializers, sync
+from elasticmodels.utils.bulk import remove_documents, update_documents
 from elasticmodels.utils.aliasing import AliasedIndex
 from elasticmodels.utils.elasticobject import ElasticObject
+from elasticmodels.utils.aggregations import parse_aggregations, with_bucket_pks
+from elasticmodels.utils.cache import hydration_cache, lean_source
+from elasticmodels.utils.hydration import hit_pk, hit_versions, hydrate_pks
+from elasticmodels.utils.profiling import profiled_search
+from elasticmodels.utils.search import ElasticQuerySet, MultiSearch
+from elasticmodels.utils.singleflight import coalesced
+from elasticmodels.utils.suggest import (parse_suggestions, suggest_body,
+    suggest_cache)
 from elasticmodels.tasks import indexing_task, bulk_indexing_task
 
 
 class AliasAlreadyExists(Exception): pass
 
 
+class SearchableQuerySet(QuerySet):
+    """ a queryset that keeps elasticsearch in sync for its bulk operations, which
+    otherwise bypass the per instance signal receivers or fire them once per row.
+    """
+    @property
+    def delete_by_query_threshold(self):
+        return getattr(settings, "ES_DELETE_BY_QUERY_THRESHOLD", 10000)
+
+    def delete(self, delete_by_query=None):
+        """ deletes the rows and removes their documents with chunked `_bulk`
+        requests after the transaction commits, instead of one request per row from
+        the `pre_delete` receiver. a single `delete_by_query` per chunk is used
+        instead when `delete_by_query` is True, or when it is left to None and there
+        are at least `ES_DELETE_BY_QUERY_THRESHOLD` rows.
+        """
+        pks, routings = self._pks_and_routings()
+        with sync.suppress_sync(self.model):
+            result = super(SearchableQuerySet, self).delete()
+        hydration_cache.invalidate(self.model, pks)
+        suggest_cache.bump(self.model)
+
+        if pks and outbox.outbox_enabled():
+            outbox.enqueue_many(self.model, pks, outbox.DELETE, routings=routings,
+                using=self.db)
+        elif pks:
+            if delete_by_query is None:
+                delete_by_query = len(pks) >= self.delete_by_query_threshold
+            manager = self.model.objects
+            sync.on_commit(partial(remove_documents, self.model, pks,
+                elasticsearch=manager.write_connections,
+                chunk_size=manager._chunk_size, delete_by_query=delete_by_query,
+                routings=routings), using=self.db)
+        return result
+    delete.alters_data = True
+    delete.queryset_only = True
+
+    def _pks_and_routings(self):
+        """ the pks of the rows and, for routed doctypes, a dict of their routings.
+        a routing attribute is read with the pks, a routing callable needs the
+        instances.
+        """
+        search_meta = self.model._search_meta
+        routing_field = search_meta.routing_field
+        if routing_field is None:
+            return list(self.values_list("pk", flat=True)), None
+        if callable(routing_field):
+            routings = {instance.pk: search_meta.get_routing(instance) for
+                instance in self.iterator()}
+        else:
+            routings = {pk: None if routing is None else str(routing) for pk, routing
+                in self.values_list("pk", search_meta.routing_attname)}
+        return list(routings), routings
+
+    def update(self, **kwargs):
+        """ updates the rows and, when any of the updated columns are mapped, re-syncs
+        the affected documents after the transaction commits with chunked partial
+        `update` actions that only contain the changed mapped fields.
+        """
+        fields = self.model._search_meta.mapped_fields(kwargs)
+        if not fields:
+            if hydration_cache.enabled:
+                # the documents are unchanged, but cached instances would be stale
+                hydration_cache.invalidate(self.model,
+                    list(self.values_list("pk", flat=True)))
+            return super(SearchableQuerySet, self).update(**kwargs)
+
+        pks = list(self.values_list("pk", flat=True))
+        rows = super(SearchableQuerySet, self).update(**kwargs)
+        hydration_cache.invalidate(self.model, pks)
+        suggest_cache.bump(self.model)
+
+        if pks and outbox.outbox_enabled():
+            outbox.enqueue_many(self.model, pks, outbox.INDEX, using=self.db)
+        elif pks:
+            manager = self.model.objects
+            sync.on_commit(partial(update_documents, self.model, pks, fields,
+                elasticsearch=manager.write_connections,
+                chunk_size=manager._chunk_size),
+                using=self.db)
+        return rows
+    update.alters_data = True
+
+
 class ElasticModelManager(ElasticObject, Manager):
     """the interface for searching, setting up and managing the elasticsearch
     document related to a django model.
     """
+    def get_queryset(self):
+        return SearchableQuerySet(self.model, using=self._db)
+
+    @property
+    def read_using(self):
+        if self.__dict__.get("model") is None:
+            return None
+        return self.model._search_meta.get_using("read")
+
+    @property
+    def write_using(self):
+        if self.__dict__.get("model") is None:
+            return None
+        return self.model._search_meta.get_using("write")
+
+    @property
+    def dual_write_using(self):
+        if self.__dict__.get("model") is None:
+            return None
+        return self.model._search_meta.get_using("dual_write")
+
     @indexing_task
-    def index_document(self, pk, instance, create=False):
-        return self.index(id=pk, body=instance, op_type="create" if create else "index")
+    def index_document(self, pk, instance, create=False, version=None):
+        """ indexes the serialized `instance` under `pk`. with a `version` the
+        request is externally versioned and a conflict, meaning a newer document is
+        already indexed, is a successful no-op.
+        """
+        kwargs = {"op_type": "create" if create else "index"}
+        if version is not None:
+            kwargs.update(version=version,
+                version_type=self.model._search_meta.version_type)
+        try:
+            return self.index(id=pk, body=instance, **kwargs)
+        except ConflictError:
+            if version is None:
+                raise
 
     @indexing_task
     def remove_document(self, pk):
         return self.delete(id=pk)
 
     def search_es(self, raw_only=False, *args, **kwargs):
-        """ put a docstring here
+        """ runs a search against the models doctype. unless `raw_only` is True the
+        hits are converted into a queryset and `(queryset, raw_results)` is returned.
+        for routed doctypes pass the `routing` to only search the matching shard.
+
+        :param ids_only: when True no `_source` is transferred for the hits, the pks
+            are read from each hits `_id` (only `date_last_updated` is, with the
+            hydration cache on). defaults to True whenever the results are
+            converted to a queryset, pass `ids_only=False` to keep the `_source`.
+        :param profile: when True a `SearchProfile` timing each phase of the search
+            is appended to the returned tuple, and the queryset is evaluated to time
+            the hydration. with `es_profile=True` it also carries the output of the
+            elasticsearch profile api.
         """
-        raw_results = self.search(*args, **kwargs)
+        ids_only = kwargs.pop("ids_only", not raw_only)
+        if ids_only:
+            kwargs.setdefault("_source", lean_source())
+
+        profile = kwargs.pop("profile", False)
+        es_profile = kwargs.pop("es_profile", False)
+        if profile:
+            return self._profiled_search_es(raw_only, es_profile, **kwargs)
+
+        # identical concurrent searches share one request, see `ES_COALESCE_SEARCHES`
+        raw_results = coalesced(partial(self.search, *args), self.index_name,
+            self.doctype_name, self.read_using, args, **kwargs)
 
         if raw_only:
             return raw_results
@@ -38,16 +190,152 @@ class ElasticModelManager(ElasticObject, Manager):
         results = self._convert_to_queryset(raw_results)
         return results, raw_results
 
+    def _profiled_search_es(self, raw_only, es_profile, body=None, **kwargs):
+        if es_profile:
+            body = dict(body or {}, profile=True)
+        raw_results, profile = profiled_search(self.read_elasticsearch,
+            index=self.index_name, doc_type=self.doctype_name, body=body, **kwargs)
+
+        if raw_only:
+            return raw_results, profile
+
+        with profile.timing("hydration"):
+            results = self._convert_to_queryset(raw_results)
+            len(results)  # fills the result cache
+        return results, raw_results, profile
+
+    def search_template_es(self, name, params=None, raw_only=False, **kwargs):
+        """ runs the search template `name` (see `MappingMeta.search_templates`) with
+        `params`, and returns the results like `search_es`. with
+        `ES_STORED_TEMPLATES` only the template id and params are sent, a template
+        missing from the cluster is rendered client side instead.
+
+        :param ids_only: see `search_es`, applies to the templates that do not set
+            their own `_source`
+        """
+        templates = self.model._search_meta.search_templates
+        params = params or {}
+        ids_only = kwargs.pop("ids_only", not raw_only)
+        raw_results = None
+        if templates.stored:
+            try:
+                raw_results = self.search_template(body=templates.request_body(name,
+                    params, ids_only=ids_only), **kwargs)
+            except NotFoundError:
+                pass
+        if raw_results is None:
+            raw_results = self.search(body=templates.render(name, params,
+                ids_only=ids_only), **kwargs)
+
+        if raw_only:
+            return raw_results
+        return self._convert_to_queryset(raw_results), raw_results
+
+    def put_search_templates(self):
+        """ stores the models search templates in the cluster, on every write
+        connection. returns the stored template ids.
+        """
+        templates = self.model._search_meta.search_templates
+        ids = []
+        for client in self.write_connections:
+            ids = templates.upload(client)
+        return ids
+
+    def suggest(self, prefix, field=None, size=10, fuzzy=None, contexts=None,
+            **kwargs):
+        """ typeahead: completes `prefix` with the completion suggester of the
+        suggest `field` (optional when the model has a single one) and returns a
+        list of `{"text", "pk", "score", <payload fields>}` dicts, without touching
+        the database. suggestions of prefixes up to
+        `ES_SUGGEST_CACHE_PREFIX_LENGTH` characters are cached in process, see
+        `elasticmodels.utils.suggest.SuggestCache`.
+        """
+        suggest_fields = self.model._search_meta.suggest_fields
+        if field is None:
+            if len(suggest_fields) != 1:
+                raise ValueError("{0} has {1} suggest fields, pass the `field` to "
+                    "suggest from".format(self.model.__name__, len(suggest_fields)))
+            field = list(suggest_fields)[0]
+        suggest_field = suggest_fields[field]
+
+        key = None
+        if suggest_cache.cacheable(prefix) and contexts is None and not kwargs and \
+                not isinstance(fuzzy, dict):
+            key = suggest_cache.key(self.model, prefix, field, size, fuzzy)
+            cached = suggest_cache.get(key)
+            if cached is not None:
+                return cached
+
+        raw_results = self.search(body=suggest_body(suggest_field, prefix, size=size,
+            fuzzy=fuzzy, contexts=contexts), **kwargs)
+        suggestions = parse_suggestions(self.model, raw_results)
+        if key is not None:
+            suggest_cache.set(key, suggestions)
+        return suggestions
+
+    def query_es(self, query=None):
+        """ a lazy, chainable search for this model, see
+        `elasticmodels.utils.search.ElasticQuerySet`
+        """
+        return ElasticQuerySet(self, query)
+
+    def count_es(self, query=None, **kwargs):
+        """ the number of documents matching `query`, using the `_count` api so no
+        hits are transferred and the database is never touched.
+        """
+        body = {"query": query} if query is not None else None
+        # `self.count` is the django manager count, the client has to be called
+        return self.read_elasticsearch.count(index=self.index_name,
+            doc_type=self.doctype_name, body=body, **kwargs)["count"]
+
+    def aggregate_es(self, aggs, query=None, bucket_pks=0, raw_only=False, **kwargs):
+        """ runs `aggs` with `size=0` and returns the parsed aggregations, see
+        `elasticmodels.utils.aggregations.parse_aggregations`.
+
+        :param bucket_pks: when greater than 0 every bucket also gets a `pks` list
+            of up to `bucket_pks` pks, read from `_id` only, for drilling down.
+        """
+        if bucket_pks:
+            aggs = with_bucket_pks(aggs, bucket_pks)
+        body = {"size": 0, "aggs": aggs}
+        if query is not None:
+            body["query"] = query
+
+        raw_results = self.search(body=body, **kwargs)
+        if raw_only:
+            return raw_results
+        return parse_aggregations(aggs, raw_results.get("aggregations", {}),
+            model=self.model)
+
+    def multi_search(self):
+        """ starts a batch of searches that are sent in one `_msearch` request.
+        searches added without a model run against this managers model.
+        see `elasticmodels.utils.search.MultiSearch`
+        """
+        return MultiSearch(self.read_elasticsearch, default_model=self.model)
+
+    def _hit_pks(self, raw_results):
+        """ the pks of the hits in the order elasticsearch returned them. `_id` is
+        always present, so this works with or without the `_source`.
+        """
+        return [hit_pk(self.model, hit) for hit in raw_results["hits"]["hits"]]
+
     def _convert_to_queryset(self, raw_results):
         """ takes the raw elasticsearch results and creates a queryset that will
         maintain the ordering of the elasticsearch results.
         """
-        pks = [result["_source"]["id"] for result in raw_results["hits"]["hits"]]
+        pks = self._hit_pks(raw_results)
+        if not pks:
+            return self.none()
         clauses = " ".join(["WHEN id={0} THEN {1}".format(pk, i)
             for i, pk in enumerate(pks)])
         ordering = "CASE {0} END".format(clauses)
         results = self.filter(pk__in=pks)\
             .extra(select={"ordering": ordering}, order_by=("ordering",))
+        if hydration_cache.enabled:
+            # only the cache misses are queried, the queryset comes pre-evaluated
+            results._result_cache = hydrate_pks(self.model, pks,
+                hit_versions(self.model, raw_results["hits"]["hits"]))
         return results
 
     def _put_mapping(self):
@@ -18,7 +18,13 @@ from elasticsearch import Elasticsearch
 from elasticmodels.options import MappingOptions
 from elasticmodels.utils.elasticobject import ElasticDoctype
 from elasticmodels.manager import ElasticModelManager
+from elasticmodels.utils import collect_indices
 from elasticmodels.utils.fields import JSONField
+from elasticmodels.utils.sync import sync_suppressed
+from elasticmodels.utils import outbox
+from elasticmodels.utils.cache import hydration_cache
+from elasticmodels.utils.suggest import suggest_cache
+from elasticmodels.utils.dependencies import tracker as dependency_tracker
 
 
 class SearchableModelMeta(ModelBase):
@@ -98,7 +104,7 @@ class SearchableModel(six.with_metaclass(SearchableModelMeta, Model)):
         super(SearchableModel, self).__init__(*args, **kwargs)
         self.es_index_name = self._search_meta.index_name
         self.es_doctype_name = self._search_meta.doctype_name
-        self.es = None
+        self._es = None
 
     is_elasticsearch_indexable = models.BooleanField(default=True)
     date_last_updated = models.DateTimeField(auto_now=True)
@@ -110,33 +116,88 @@ class SearchableModel(six.with_metaclass(SearchableModelMeta, Model)):
                 self.is_elasticsearch_indexable = True
                 self.save()  # saving will automatically add to es
             else:
-                self.es.update_document(self.es_serialized)
+                self._use_owning_index()
+                self.es.update_document(self.es_serialized,
+                    **self._search_meta.version_params(self))
         return self
 
     def remove_from_elasticsearch(self, never_index=False):
+        self._use_owning_index()
         self.es.remove_document()
         if never_index:
             self.is_elasticsearch_indexable = False
             self.save()
         return self
 
+    def _get_es(self):
+        if self._es is None:
+            search_meta = self._search_meta
+            self._es = ElasticDoctype(search_meta.write_index_name,
+                self.es_doctype_name, self.pk, routing=search_meta.get_routing(self),
+                read_using=search_meta.get_using("read"),
+                write_using=search_meta.get_using("write"),
+                dual_write_using=search_meta.get_using("dual_write"))
+        return self._es
+
+    def _use_owning_index(self):
+        """ points `es` at the bucket already holding the document of a doctype in
+        a `RollingIndex`, writing to the write alias would duplicate it
+        """
+        rolling_index = self._search_meta.rolling_index
+        if rolling_index is not None:
+            owners = rolling_index.owning_indices(self.es_doctype_name, [self.pk])
+            self.es.index_name = owners.get(six.text_type(self.pk),
+                self._search_meta.write_index_name)
+
+    def _set_es(self, es_doctype):
+        self._es = es_doctype
+
+    es = property(_get_es, _set_es)
+
     @property
     def es_serialized(self):
         serializer = self._search_meta.serializer_class(self)
         return serializer.serialize(to_json=True)
 
 
+class IndexOutbox(models.Model):
+    """ a pending elasticsearch operation, recorded by the sync receivers when
+    `ES_OUTBOX` is set and shipped in bulk by the `drain_index_outbox` command.
+    """
+    OPS = ((outbox.INDEX, "index"), (outbox.DELETE, "delete"))
+
+    model = models.CharField(max_length=255)  # "app_label.ObjectName"
+    object_pk = models.CharField(max_length=255)
+    op = models.CharField(max_length=6, choices=OPS)
+    routing = models.CharField(max_length=255, null=True, blank=True)
+    date_created = models.DateTimeField(auto_now_add=True)
+    # failed deliveries, see `ES_OUTBOX_MAX_ATTEMPTS`
+    attempts = models.PositiveIntegerField(default=0)
+    last_error = models.TextField(null=True, blank=True)
+
+    def __str__(self):
+        return "{0} {1}.{2}".format(self.op, self.model, self.object_pk)
+
+
 def update_es_instance(sender, instance, **kwargs):
     """ post save reciever for SearchableModel subclasses
     simply initializes the model .es object, serializes it, and ships the document for
     indexing in elasticsearch.
     """
     if issubclass(sender, SearchableModel):
+        hydration_cache.invalidate(sender, [instance.pk])
+        suggest_cache.bump(sender)
+    if issubclass(sender, SearchableModel) and not sync_suppressed(sender):
+        if outbox.outbox_enabled():
+            outbox.enqueue(instance, outbox.INDEX, using=kwargs.get("using"))
+            return
+        index = collect_indices(instance.es_index_name)
+        if not isinstance(index, (list, tuple)):
+            index.maybe_rollover()
         created = kwargs.get("created", False)
         if created:
-            instance.es = ElasticDoctype(instance.es_index_name,
-                    instance.es_doctype_name, instance.pk)
-            instance.es.update_document(instance.es_serialized)
+            instance.es.update_document(instance.es_serialized,
+                **instance._search_meta.version_params(instance))
         else:
             instance.send_to_elasticsearch()
 
@@ -145,12 +206,51 @@ def remove_es_instance(sender, instance, **kwargs):
     """ post delete reciever for SearchableModel subclasses.
     """
     if issubclass(sender, SearchableModel):
+        hydration_cache.invalidate(sender, [instance.pk])
+        suggest_cache.bump(sender)
+    if issubclass(sender, SearchableModel) and not sync_suppressed(sender):
+        if outbox.outbox_enabled():
+            outbox.enqueue(instance, outbox.DELETE, using=kwargs.get("using"))
+            return
         instance.remove_from_elasticsearch()
 
 
+def update_es_dependents(sender, instance, **kwargs):
+    """ post save reciever that queues the documents embedding `instance` for
+    reindexing, see `MappingMeta.dependencies`.
+    """
+    dependency_tracker.related_saved(sender, instance,
+        created=kwargs.get("created", False),
+        update_fields=kwargs.get("update_fields"), using=kwargs.get("using"))
+
+
+def remove_es_dependents(sender, instance, **kwargs):
+    """ pre delete reciever, the counterpart of `update_es_dependents`.
+    """
+    dependency_tracker.related_deleted(sender, instance, using=kwargs.get("using"))
+
+
+def snapshot_es_dependents(sender, instance, **kwargs):
+    """ post init reciever that remembers the loaded values of the related fields
+    documents embed, so saves that leave them alone reindex nothing.
+    """
+    dependency_tracker.related_loaded(sender, instance)
+
+
+def update_es_m2m_dependents(sender, instance, action, reverse, pk_set, **kwargs):
+    """ m2m changed reciever, reindexes the documents embedding the links.
+    """
+    dependency_tracker.related_m2m_changed(sender, instance, action, reverse,
+        pk_set, using=kwargs.get("using"))
+
+
 if getattr(settings, "ES_AUTO_SYNC", True):
     signals.post_save.connect(update_es_instance, dispatch_uid=uuid.uuid1())
     signals.pre_delete.connect(remove_es_instance, dispatch_uid=uuid.uuid1())
+    signals.post_save.connect(update_es_dependents, dispatch_uid=uuid.uuid1())
+    signals.pre_delete.connect(remove_es_dependents, dispatch_uid=uuid.uuid1())
+    signals.post_init.connect(snapshot_es_dependents, dispatch_uid=uuid.uuid1())
+    signals.m2m_changed.connect(update_es_m2m_dependents, dispatch_uid=uuid.uuid1())
 
 
 from elasticmodels.utils.migration import SearchableModelMigrationManager as \
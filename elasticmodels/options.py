@@ -2,16 +2,44 @@
 # author: andrew young
 # email: ayoung@thewulf.org
 
+import calendar
+import datetime
+
 from django.conf import settings
 from django.core.exceptions import FieldDoesNotExist
+from django.utils import six
 
 from elasticsearch import Elasticsearch
 
 from elasticmodels.utils import mapping, serializers, collect_indices
+from elasticmodels.utils.serializers import LazyJSON
+from elasticmodels.utils.cache import VERSION_FIELD, hydration_cache
+from elasticmodels.utils.dependencies import Dependency
+from elasticmodels.utils.templates import TemplateRegistry
 
 
 class CustomFieldNotDefinedError(Exception): pass
 class IndexNotInstalledError(Exception): pass
+class TruncatedFieldIndexedError(Exception): pass
+class TruncatedFieldNotMappedError(Exception): pass
+
+
+EMPTY_JSON = frozenset(["null", "{}", "[]", '""'])
+
+
+def is_empty(value):
+    """ null, empty strings and collections, relations without ids and undecoded
+    json of any of those.
+    """
+    if value is None:
+        return True
+    if isinstance(value, LazyJSON):
+        return value.raw.strip() in EMPTY_JSON
+    if isinstance(value, dict) and set(value) == set(["id", "value"]):
+        return not value["id"]
+    if isinstance(value, (six.string_types, list, tuple, dict, set)):
+        return not value
+    return False
 
 
 class MappingOptions(object):
@@ -43,22 +71,191 @@ class MappingOptions(object):
         _fields = getattr(options, "fields", [])
         _fields.extend(self.custom_fields.keys())
         self.fields = self._get_fields(_fields, self.excluded_fields)
+        self._add_version_field()
 
         self.id_field_type = getattr(options, "id_field_type", "long")
         self.fields.append(mapping.SearchField("id", self.id_field_type))
 
+        # completion fields for typeahead, see `mapping.SuggestField`
+        self.suggest_fields = dict((name, mapping.SuggestField(name, **field_options))
+            for name, field_options in getattr(options, "suggest_fields",
+            dict()).items())
+        self.fields.extend(self.suggest_fields.values())
+
         # get the serializer class
         self.serializer_class = getattr(options, "serializer_class",
             serializers.ModelJSONSerializer)
 
+        # lookup paths to related models whose changes need to be reindexed into
+        # this models documents, and the related fields that matter.
+        # see `elasticmodels.utils.dependencies.Dependency`
+        self.dependencies = [Dependency(model, path, fields) for path, fields in
+            getattr(options, "dependencies", dict()).items()]
+
+        # the attribute name, or a callable taking the instance, that gives the
+        # shard routing of each document. with `routing_required` the mapping makes
+        # elasticsearch reject any request for this doctype without a routing
+        self.routing_field = getattr(options, "routing_field", None)
+        self.routing_required = getattr(options, "routing_required", False)
+
+        # a monotonically increasing attribute (ie "date_last_updated" or a counter
+        # column) sent as an external version with every index request, so an
+        # older write landing last can never overwrite a newer document. the same
+        # version is accepted again ("external_gte"), reindexing an unchanged row
+        # (dependency reindexes, rebuilds, the outbox) must not be dropped
+        self.version_field = getattr(options, "version_field", None)
+        self.version_type = getattr(options, "version_type", "external_gte")
+
+        # names of `ES_CONNECTIONS` entries, when left out the ones of the installed
+        # index are used. see `ElasticObject`
+        self.read_using = getattr(options, "read_using", None)
+        self.write_using = getattr(options, "write_using", None)
+        self.dual_write_using = getattr(options, "dual_write_using", None)
+
+        # payload minimization: with `strip_empty` null and empty values are left out
+        # of full documents, `truncate_fields` maps fields that are not indexed
+        # (ie only stored for display) to the max length of their strings
+        self.strip_empty = getattr(options, "strip_empty", False)
+        self.truncate_fields = getattr(options, "truncate_fields", dict())
+        self._check_truncate_fields()
+
+        # search bodies with "{{param}}" placeholders, called by name.
+        # see `elasticmodels.utils.templates.TemplateRegistry`
+        self.search_templates = TemplateRegistry("{0}.{1}".format(self.index_name,
+            self.doctype_name), getattr(options, "search_templates", dict()))
+
+    def _check_truncate_fields(self):
+        mapped = dict((field.name, field) for field in self.fields)
+        for name in self.truncate_fields:
+            if name not in mapped:
+                raise TruncatedFieldNotMappedError("{0}.{1} is in truncate_fields but"
+                    " it is not a mapped field".format(self.model.__name__, name))
+            options = mapped[name].field_mapping
+            if options.get("index") not in ("no", False) and \
+                    options.get("enabled") is not False:
+                raise TruncatedFieldIndexedError("{0}.{1} can only be truncated when"
+                    " it is not indexed".format(self.model.__name__, name))
+
+    def minimize_document(self, document, partial=False):
+        """ applies `truncate_fields` and, unless the `document` is a `partial`
+        update (where a null clears the value), `strip_empty`, in place.
+        """
+        for name, length in self.truncate_fields.items():
+            value = document.get(name)
+            if isinstance(value, six.string_types) and len(value) > length:
+                document[name] = value[:length]
+        if self.strip_empty and not partial:
+            for name in [name for name, value in document.items() if
+                    is_empty(value)]:
+                del document[name]
+        return document
+
+    def get_version(self, instance):
+        """ the external version of `instance`s document, datetimes are turned into
+        microseconds since the epoch. None without a version_field.
+        """
+        if self.version_field is None:
+            return None
+        version = getattr(instance, self.version_field)
+        if isinstance(version, datetime.datetime):
+            version = calendar.timegm(version.utctimetuple()) * 1000000 + \
+                version.microsecond
+        return None if version is None else int(version)
+
+    def version_params(self, instance):
+        """ the request parameters for an externally versioned index request
+        """
+        version = self.get_version(instance)
+        if version is None:
+            return {}
+        return {"version": version, "version_type": self.version_type}
+
+    @property
+    def rolling_index(self):
+        """ the `RollingIndex` this doctype is installed in, or None
+        """
+        index = collect_indices(self.index_name)
+        return index if getattr(index, "write_alias", None) else None
+
+    @property
+    def write_index_name(self):
+        """ the alias writes go to, it differs from `index_name` for a `RollingIndex`
+        """
+        index = collect_indices(self.index_name)
+        return getattr(index, "write_alias", None) or self.index_name
+
+    def get_using(self, mode):
+        """ the connection name for `mode`, one of "read", "write" or "dual_write"
+        """
+        attr = "{0}_using".format(mode)
+        using = getattr(self, attr)
+        if using is None:
+            index = collect_indices(self.index_name)
+            if not isinstance(index, (list, tuple)):
+                using = getattr(index, attr, None)
+        return using
+
+    def get_routing(self, instance):
+        """ the routing value of `instance`s document, None without a routing_field
+        """
+        if self.routing_field is None:
+            return None
+        if callable(self.routing_field):
+            routing = self.routing_field(instance)
+        else:
+            routing = getattr(instance, self.routing_attname)
+        return None if routing is None else str(routing)
+
+    @property
+    def routing_attname(self):
+        """ the attribute a `routing_field` name is read from, the id column of a
+        foreign key rather than the related instance. None for a callable
+        """
+        if self.routing_field is None or callable(self.routing_field):
+            return None
+        try:
+            return self.model._meta.get_field(self.routing_field).attname
+        except FieldDoesNotExist:
+            return self.routing_field
+
+    def mapped_fields(self, names):
+        """ the names of the mapped fields among the model field names or attnames
+        in `names`, and of the suggest fields fed from them
+        """
+        mapped = set(field.name for field in self.fields)
+        found = set()
+        for name in names:
+            try:
+                name = self.model._meta.get_field(name).name
+            except FieldDoesNotExist:
+                pass
+            if name in mapped:
+                found.add(name)
+            found.update(field.name for field in self.suggest_fields.values() if
+                field.source == name)
+        return found
+
     @property
     def index(self):
         index = collect_indices(self.index_name)
-        if isinstance(self.index, (list, tuple)):
+        if isinstance(index, (list, tuple)):
             raise IndexNotInstalledError("Please add {0} to ES_INSTALLED_INDICES in"
                 " your settings module".format(self.index_name))
         return index
 
+    def _add_version_field(self):
+        """ keeps `date_last_updated` in the document while the hydration cache is
+        on, unless it is excluded, the cache is keyed on it.
+        """
+        if not hydration_cache.enabled or VERSION_FIELD in self.excluded_fields or \
+                any(field.name == VERSION_FIELD for field in self.fields):
+            return
+        try:
+            field_class = self.model._meta.get_field(VERSION_FIELD)
+        except FieldDoesNotExist:
+            return
+        self.fields.append(mapping.SearchField(VERSION_FIELD, field_class))
+
     def _get_fields(self, fields, exclude):
         """
         """
@@ -79,9 +276,8 @@ class MappingOptions(object):
                     field_class = self.custom_fields[field]
                 except KeyError as err:
                     raise CustomFieldNotDefinedError(err)
-            fields.append(
-                mapping.SearchField(field, field_class),
-                **self.additional_options.get(field, dict()))
+            fields.append(mapping.SearchField(field, field_class,
+                **self.additional_options.get(field, dict())))
 
         return fields
 
@@ -92,6 +288,8 @@ class MappingOptions(object):
         if not self._mapping["properties"]:
             for field in self.fields:
                 self._mapping["properties"].update({field.name: field.field_mapping})
+            if self.routing_required:
+                self._mapping["_routing"] = {"required": True}
         return self._mapping
 
     def recalculate_mapping(self):
@@ -0,0 +1,163 @@
+# tests/test_manager.py
+# author: andrew young
+# email: ayoung@thewulf.org
+
+import json
+
+from django.test import TestCase, override_settings
+from django.db import models as dmod
+from django.db.models import signals
+
+from elasticsearch import Elasticsearch
+
+from elasticmodels.manager import ElasticModelManager
+from elasticmodels.models import SearchableModel
+from elasticmodels.utils.sync import suppress_sync, sync_suppressed
+from elasticmodels.tests.test_elasticmodel import TestModelA
+
+
+class FakeClient(Elasticsearch):
+    """ records the requests sent through it and answers them from `responses`, a
+    dict of method name -> response, exception or callable taking the request
+    """
+    def __init__(self, **responses):
+        super(FakeClient, self).__init__()
+        self.responses = responses
+        self.requests = []
+
+    def _respond(self, method, kwargs):
+        self.requests.append((method, kwargs))
+        response = self.responses[method]
+        if isinstance(response, Exception):
+            raise response
+        return response(**kwargs) if callable(response) else response
+
+    def search(self, **kwargs):
+        return self._respond("search", kwargs)
+
+    def count(self, **kwargs):
+        return self._respond("count", kwargs)
+
+    def msearch(self, **kwargs):
+        return self._respond("msearch", kwargs)
+
+    def bulk(self, body, **kwargs):
+        return self._respond("bulk", dict(kwargs, body=body))
+
+    def delete_by_query(self, **kwargs):
+        return self._respond("delete_by_query", kwargs)
+
+
+def id_hits(pks):
+    """ a search response with `_id` only hits for `pks`
+    """
+    return {"hits": {"total": len(pks), "hits": [{"_id": str(pk)} for pk in pks]}}
+
+
+class TestingManagerCase(TestCase):
+    def test_defining_a_searchable_model(self):
+        class DefinedModel(SearchableModel):
+            class Meta:
+                app_label = "elasticmodels"
+
+            class MappingMeta:
+                read_using = "replica"
+                write_using = "primary"
+
+            test_char = dmod.CharField(max_length=10)
+
+        manager = DefinedModel.objects
+        self.assertIs(manager.model, DefinedModel)
+        self.assertEqual(manager.read_using, "replica")
+        self.assertEqual(manager.write_using, "primary")
+
+    def test_unbound_manager_has_no_connections(self):
+        manager = ElasticModelManager()
+        self.assertIsNone(manager.read_using)
+        self.assertIsNone(manager.write_using)
+        self.assertRaises(AttributeError, getattr, manager, "__setstate__")
+
+
+def bulk_statuses(statuses):
+    """ a bulk response giving the actions of the request the `statuses` of their
+    `_id`, 200 by default
+    """
+    def respond(body, **kwargs):
+        items = []
+        for line in body.splitlines():
+            (op_type, action), = json.loads(line).items()
+            status = statuses.get(action["_id"], 200)
+            items.append({op_type: {"_id": action["_id"], "status": status}})
+        return {"errors": any(statuses.values()), "items": items}
+    return respond
+
+
+class TestingManagerSearchCase(TestCase):
+    def setUp(self):
+        with suppress_sync(TestModelA):
+            self.instances = [TestModelA.objects.create(test_int=i,
+                test_char=str(i), test_float=i / 2.0) for i in range(3)]
+        self.client = FakeClient()
+        TestModelA.objects.elasticsearch = self.client
+
+    def tearDown(self):
+        TestModelA.objects._elastic = None
+
+    def test_hits_are_converted_from_their_ids(self):
+        pks = [instance.pk for instance in reversed(self.instances)]
+        self.client.responses["search"] = id_hits(pks)
+        results, raw_results = TestModelA.objects.search_es(
+            body={"query": {"match_all": {}}})
+        self.assertEqual([instance.pk for instance in results], pks)
+        self.assertIs(self.client.requests[0][1]["_source"], False)
+
+        TestModelA.objects.search_es(raw_only=True)
+        self.assertNotIn("_source", self.client.requests[1][1])
+
+    def test_count_es_uses_the_count_api(self):
+        self.client.responses["count"] = {"count": 42}
+        self.assertEqual(TestModelA.objects.count_es({"term": {"test_int": 1}}), 42)
+        self.assertEqual(self.client.requests, [("count", {
+            "index": TestModelA._search_meta.index_name,
+            "doc_type": TestModelA._search_meta.doctype_name,
+            "body": {"query": {"term": {"test_int": 1}}}})])
+        self.assertEqual(TestModelA.objects.count(), 3)
+
+
+class TestingQuerySetDeleteCase(TestCase):
+    def setUp(self):
+        with suppress_sync(TestModelA):
+            self.pks = [TestModelA.objects.create(test_int=i, test_char=str(i),
+                test_float=i / 2.0).pk for i in range(3)]
+        self.client = FakeClient(delete_by_query={"deleted": 3},
+            bulk=bulk_statuses({str(self.pks[0]): 404}))
+        TestModelA.objects.elasticsearch = self.client
+        self.suppressed = []
+        signals.pre_delete.connect(self.pre_delete, sender=TestModelA)
+
+    def tearDown(self):
+        signals.pre_delete.disconnect(self.pre_delete, sender=TestModelA)
+        TestModelA.objects._elastic = None
+
+    def pre_delete(self, sender, instance, **kwargs):
+        self.suppressed.append(sync_suppressed(sender))
+
+    def test_one_bulk_request_tolerating_missing_documents(self):
+        TestModelA.objects.all().delete()
+        self.assertFalse(TestModelA.objects.exists())
+        self.assertEqual(self.suppressed, [True] * 3)
+        self.assertEqual([method for method, kwargs in self.client.requests],
+            ["bulk"])
+        actions = [json.loads(line)["delete"] for line in
+            self.client.requests[0][1]["body"].splitlines()]
+        self.assertEqual(sorted(int(action["_id"]) for action in actions), self.pks)
+
+    def test_delete_by_query_past_the_threshold(self):
+        with override_settings(ES_DELETE_BY_QUERY_THRESHOLD=2):
+            TestModelA.objects.filter(pk=self.pks[0]).delete()
+            self.assertEqual(self.client.requests[0][0], "bulk")
+            TestModelA.objects.all().delete()
+        self.assertEqual(self.client.requests[1], ("delete_by_query", {
+            "index": TestModelA._search_meta.write_index_name,
+            "doc_type": TestModelA._search_meta.doctype_name,
+            "body": {"query": {"ids": {"values": self.pks[1:]}}}}))
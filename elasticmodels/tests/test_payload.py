@@ -0,0 +1,70 @@
+# tests/test_payload.py
+# author: andrew young
+# email: ayoung@thewulf.org
+
+import copy
+import gzip
+import io
+import json
+
+from django.db import models as dmod
+from django.test import TestCase
+
+from elasticmodels import connect
+from elasticmodels.connection import GzipConnection
+from elasticmodels.models import SearchableModel
+from elasticmodels.options import (TruncatedFieldIndexedError,
+    TruncatedFieldNotMappedError)
+
+
+class CompactModel(SearchableModel):
+    class MappingMeta:
+        index_name = "a-cool-index"
+        fields = ["title", "description", "price"]
+        strip_empty = True
+        truncate_fields = {"description": 5}
+        additional_options = {"description": {"index": False}}
+
+    title = dmod.CharField(max_length=10, blank=True)
+    description = dmod.TextField(blank=True)
+    price = dmod.FloatField(null=True)
+
+
+class TestingPayloadCase(TestCase):
+    def setUp(self):
+        self.search_meta = CompactModel._search_meta
+
+    def test_empty_values_are_stripped_and_long_ones_truncated(self):
+        instance = CompactModel(title="", description="lorem ipsum", price=None)
+        document = json.loads(instance.es_serialized)
+        self.assertEqual(document["description"], "lorem")
+        self.assertNotIn("title", document)
+        self.assertNotIn("price", document)
+
+    def test_partial_updates_keep_empty_values(self):
+        document = self.search_meta.minimize_document({"title": "", "price": None,
+            "description": "lorem ipsum"}, partial=True)
+        self.assertEqual(document, {"title": "", "price": None,
+            "description": "lorem"})
+
+    def test_only_mapped_unindexed_fields_can_be_truncated(self):
+        search_meta = copy.copy(self.search_meta)
+        search_meta.truncate_fields = {"title": 5}
+        self.assertRaises(TruncatedFieldIndexedError,
+            search_meta._check_truncate_fields)
+        search_meta.truncate_fields = {"summary": 5}
+        self.assertRaises(TruncatedFieldNotMappedError,
+            search_meta._check_truncate_fields)
+
+    def test_gzip_connections(self):
+        with self.settings(ES_GZIP_LEVEL=None):
+            self.assertNotIsInstance(connect().transport.get_connection(),
+                GzipConnection)
+
+        connection = connect(compresslevel=1).transport.get_connection()
+        self.assertIsInstance(connection, GzipConnection)
+        self.assertTrue(connection.http_compress)
+        self.assertEqual(connection.compresslevel, 1)
+        compressed = connection._gzip_compress(b'{"index":{}}')
+        with gzip.GzipFile(fileobj=io.BytesIO(compressed)) as body:
+            self.assertEqual(body.read(), b'{"index":{}}')
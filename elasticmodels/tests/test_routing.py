@@ -0,0 +1,51 @@
+# tests/test_routing.py
+# author: andrew young
+# email: ayoung@thewulf.org
+
+from django.db import models as dmod
+from django.test import TestCase
+
+from elasticmodels.models import SearchableModel
+from elasticmodels.utils.bulk import ChunkSerializer
+from elasticmodels.utils.sync import suppress_sync
+
+
+class Tenant(dmod.Model):
+    name = dmod.CharField(max_length=20)
+
+    def __str__(self):
+        return self.name
+
+
+class TenantNote(SearchableModel):
+    class MappingMeta:
+        index_name = "a-cool-index"
+        fields = ["text"]
+        routing_field = "tenant"
+
+    text = dmod.CharField(max_length=20)
+    tenant = dmod.ForeignKey(Tenant)
+
+
+class TestingRoutingCase(TestCase):
+    def setUp(self):
+        self.tenant = Tenant.objects.create(name="acme")
+        with suppress_sync(TenantNote):
+            self.note = TenantNote.objects.create(text="a", tenant=self.tenant)
+        self.routing = str(self.tenant.pk)
+
+    def test_foreign_keys_route_on_their_id(self):
+        search_meta = TenantNote._search_meta
+        self.assertEqual(search_meta.routing_attname, "tenant_id")
+        self.assertEqual(search_meta.get_routing(self.note), self.routing)
+        self.assertEqual(self.note.es.routing, self.routing)
+
+    def test_bulk_paths_use_the_same_routing(self):
+        pks, routings = TenantNote.objects.all()._pks_and_routings()
+        self.assertEqual(routings, {self.note.pk: self.routing})
+
+        for values in (False, True):
+            chunker = ChunkSerializer(TenantNote.objects.all(), op_type="index",
+                values=values)
+            self.assertEqual([action["_routing"] for chunk in chunker for action in
+                chunk], [self.routing])
@@ -0,0 +1,50 @@
+# tests/test_utils_aggregations.py
+# author: andrew young
+# email: ayoung@thewulf.org
+
+import datetime
+
+from django.test import TestCase
+from django.utils import timezone
+
+from elasticmodels.utils.aggregations import parse_aggregations, with_bucket_pks
+from elasticmodels.tests.test_elasticmodel import TestModelA
+
+
+class TestingAggregationsCase(TestCase):
+    def setUp(self):
+        self.aggs = {
+            "by_char": {"terms": {"field": "test_char"}},
+            "by_int": {"range": {"field": "test_int",
+                "ranges": [{"to": 10}, {"from": 10}]}},
+            "by_day": {"date_histogram": {"field": "date_last_updated",
+                "interval": "day"}},
+            "max_float": {"max": {"field": "test_float"}},
+        }
+
+    def test_bucket_pks_are_added_to_bucket_aggregations_only(self):
+        aggs = with_bucket_pks(self.aggs, 3)
+        self.assertEqual(aggs["by_char"]["aggs"]["_pks"],
+            {"top_hits": {"size": 3, "_source": False}})
+        self.assertIn("_pks", aggs["by_day"]["aggs"])
+        self.assertNotIn("aggs", aggs["max_float"])
+        self.assertNotIn("aggs", self.aggs["by_char"])
+
+    def test_parses_buckets_and_metrics(self):
+        response = {
+            "by_char": {"buckets": [{"key": "hello", "doc_count": 2,
+                "_pks": {"hits": {"hits": [{"_id": "1"}, {"_id": "7"}]}}}]},
+            "by_int": {"buckets": [{"key": "*-10.0", "to": 10.0, "doc_count": 4}]},
+            "by_day": {"buckets": [{"key": 1440979200000, "doc_count": 1,
+                "key_as_string": "2015-08-31T00:00:00.000Z"}]},
+            "max_float": {"value": 3.14},
+        }
+        parsed = parse_aggregations(self.aggs, response, model=TestModelA)
+
+        self.assertEqual(parsed["by_char"],
+            [{"key": "hello", "count": 2, "pks": [1, 7]}])
+        self.assertEqual(parsed["by_int"],
+            [{"key": "*-10.0", "count": 4, "from": None, "to": 10.0}])
+        self.assertEqual(parsed["by_day"][0]["key"],
+            datetime.datetime(2015, 8, 31, tzinfo=timezone.utc))
+        self.assertEqual(parsed["max_float"], 3.14)
@@ -0,0 +1,78 @@
+# tests/test_utils_aliasing.py
+# author: andrew young
+# email: ayoung@thewulf.org
+
+from django.test import TestCase, override_settings
+
+from elasticsearch.exceptions import NotFoundError, TransportError
+
+from elasticmodels.utils.aliasing import alias_cache
+from elasticmodels.utils.migration import SearchableModelMigrationManager
+from elasticmodels.tests.test_manager import FakeClient
+
+
+class FakeIndices(object):
+    """ an indices client serving `aliases`, a dict of alias -> index names or the
+    exception to raise
+    """
+    def __init__(self, aliases):
+        self.aliases = aliases
+        self.lookups = 0
+
+    def get_alias(self, name):
+        self.lookups += 1
+        indices = self.aliases[name]
+        if isinstance(indices, Exception):
+            raise indices
+        return dict((index, {"aliases": {name: {}}}) for index in indices)
+
+    def put_alias(self, index, name):
+        self.aliases[name] = [index]
+
+    def delete_alias(self, index, name):
+        self.aliases[name] = NotFoundError(404, "aliases_not_found_exception")
+
+
+class TestingAliasCacheCase(TestCase):
+    def setUp(self):
+        alias_cache.invalidate()
+        self.indices = FakeIndices({"a-cool-index": ["a-cool-index_1"]})
+        client = FakeClient()
+        client.indices = self.indices
+        self.manager = SearchableModelMigrationManager("a-cool-index")
+        self.manager.elasticsearch = client
+
+    def tearDown(self):
+        alias_cache.invalidate()
+
+    def test_aliases_are_served_from_the_cache_until_the_ttl(self):
+        for i in range(2):
+            self.assertEqual(self.manager._get_current_index_name(),
+                "a-cool-index_1")
+        self.assertEqual(self.indices.lookups, 1)
+
+        alias_cache.invalidate()
+        with override_settings(ES_ALIAS_CACHE_TTL=0):
+            for i in range(2):
+                self.manager._get_current_index_name()
+        self.assertEqual(self.indices.lookups, 3)
+
+    def test_changing_an_alias_invalidates_it(self):
+        self.manager._get_current_index_name()
+        self.manager._put_alias("a-cool-index_2")
+        self.assertEqual(self.manager._get_current_index_name(), "a-cool-index_2")
+        self.manager._delete_alias("a-cool-index_2")
+        self.assertEqual(self.manager._get_current_index_name(), "a-cool-index_0")
+        self.assertEqual(self.indices.lookups, 3)
+
+    def test_only_a_missing_alias_is_revision_0(self):
+        self.indices.aliases["a-cool-index"] = TransportError(500, "unavailable")
+        self.assertRaises(TransportError, self.manager._get_current_index_name)
+        self.indices.aliases["a-cool-index"] = NotFoundError(404, "missing")
+        self.assertEqual(self.manager._get_current_index_name(), "a-cool-index_0")
+        self.assertFalse(self.manager.initialized)
+
+    def test_the_highest_revision_is_current(self):
+        self.indices.aliases["a-cool-index"] = ["a-cool-index_9", "a-cool-index_10",
+            "a-cool-index_2"]
+        self.assertEqual(self.manager._get_current_index_name(), "a-cool-index_10")
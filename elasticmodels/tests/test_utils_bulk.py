@@ -2,9 +2,114 @@
 # author: andrew young
 # email: ayoung@thewulf.org
 
-from django.test import TestCase
+import json
+import threading
+
+from django.test import TestCase, override_settings
+
+from elasticsearch.helpers import BulkIndexError
+
+from elasticmodels.utils.bulk import (ChunkSerializer, BulkPipeline, _send_chunk,
+    indexable_queryset)
+from elasticmodels.utils.sync import suppress_sync
+from elasticmodels.tests.test_elasticmodel import TestModelA, TestModelB
 
 
 class TestingBulkCase(TestCase):
-    pass
+    def setUp(self):
+        with suppress_sync(TestModelA), suppress_sync(TestModelB):
+            for i in range(3):
+                TestModelA.objects.create(test_int=i, test_char=str(i),
+                    test_float=i / 2.0)
+                TestModelB.objects.create(test_int=i, test_char=str(i),
+                    test_float=i / 2.0)
+
+    def _sources(self, model, values):
+        chunker = ChunkSerializer(model.objects.all(), op_type="index",
+            chunk_size=2, values=values)
+        return {action["_id"]: json.loads(action["_source"]) for chunk in chunker
+            for action in chunk}
+
+    def test_values_documents_match_instance_documents(self):
+        self.assertEqual(self._sources(TestModelA, True),
+            self._sources(TestModelA, False))
+
+    def test_serialize_methods_fall_back_to_instances(self):
+        sources = self._sources(TestModelB, True)
+        self.assertEqual(sources, self._sources(TestModelB, False))
+        self.assertEqual(list(sources.values())[0]["tricky_field"]["tricky_field"],
+            {"foo": "bar"})
+
+    def test_only_versioned_conflicts_are_ignored(self):
+        conflicts = [{"index": {"_id": "1", "status": 409}},
+            {"create": {"_id": "2", "status": 409}}]
+
+        def send_chunk(client, chunk, raise_on_error=True):
+            return len(chunk) - len(conflicts), conflicts
+
+        versioned = {"_op_type": "index", "_id": 1, "_version": 2,
+            "_version_type": "external_gte"}
+        created = {"_op_type": "create", "_id": 2}
+        self.assertRaises(BulkIndexError, _send_chunk, send_chunk, None,
+            [versioned, created])
+        created.update(_version=2, _version_type="external_gte")
+        self.assertEqual(_send_chunk(send_chunk, None, iter([versioned, created])),
+            (0, []))
+
+    def test_partial_updates_of_missing_documents_are_skipped(self):
+        def send_chunk(client, chunk, raise_on_error=True):
+            return 0, [{"update": {"_id": "1", "status": 404}}]
+
+        self.assertEqual(_send_chunk(send_chunk, None, [{"_op_type": "update",
+            "_id": 1, "doc": {}}]), (0, []))
+
+    def test_unindexable_rows_are_left_out(self):
+        TestModelA.objects.filter(test_int=0).update(
+            is_elasticsearch_indexable=False)
+        self.assertEqual(sorted(indexable_queryset(TestModelA).values_list(
+            "test_int", flat=True)), [1, 2])
+
+    def test_values_serialization_setting_is_read_per_serializer(self):
+        with override_settings(ES_VALUES_SERIALIZATION=True):
+            chunker = ChunkSerializer(TestModelB.objects.all(), op_type="index")
+        self.assertTrue(chunker.values)
+        self.assertIsNotNone(chunker.values_serializer)
+        chunker = ChunkSerializer(TestModelB.objects.all(), op_type="index")
+        self.assertFalse(chunker.values)
+        self.assertIsNone(chunker.values_serializer)
+
+    def _pipeline(self, send_chunk):
+        chunker = ChunkSerializer(TestModelA.objects.all(), op_type="index",
+            chunk_size=1)
+        pipeline = BulkPipeline(chunker, elasticsearch=object(), serializers=2,
+            senders=2)
+        pipeline._send_chunk = send_chunk
+        return pipeline
+
+    def test_pipeline_only_queries_in_the_fetch_stage(self):
+        chunker = ChunkSerializer(TestModelB.objects.all(), op_type="index")
+        actions = chunker.fetch_chunk(list(TestModelB.objects.all()))
+        with self.assertNumQueries(0):
+            chunker.encode_chunk(actions)
+        self.assertTrue(all(isinstance(action["_source"], str) for action in
+            actions))
+
+    def test_pipeline_sends_every_chunk(self):
+        sent = []
+
+        def send_chunk(client, chunk, raise_on_error=True):
+            sent.extend(json.loads(action["_source"])["test_int"] for action in
+                chunk)
+            return len(chunk), []
+
+        self._pipeline(send_chunk).run()
+        self.assertEqual(sorted(sent), [0, 1, 2])
+
+    def test_pipeline_raises_the_first_error_and_stops(self):
+        threads = threading.active_count()
+
+        def send_chunk(client, chunk, raise_on_error=True):
+            raise ValueError("rejected")
 
+        self.assertRaises(ValueError, self._pipeline(send_chunk).run)
+        self.assertEqual(threading.active_count(), threads)
@@ -0,0 +1,34 @@
+# tests/test_utils_cache.py
+# author: andrew young
+# email: ayoung@thewulf.org
+
+from django.test import TestCase
+
+from elasticmodels.utils.cache import LRUCache, HydrationCache
+from elasticmodels.tests.test_elasticmodel import TestModelA
+
+
+class TestingHydrationCacheCase(TestCase):
+    def test_lru_evicts_the_least_recently_used(self):
+        cache = LRUCache(maxsize=2)
+        cache.set_many({"a": 1, "b": 2})
+        cache.get_many(["a"])
+        cache.set_many({"c": 3})
+        self.assertEqual(cache.get_many(["a", "b", "c"]), {"a": 1, "c": 3})
+
+    def test_entries_are_only_used_for_the_same_version(self):
+        cache = HydrationCache(backend=LRUCache())
+        instance = TestModelA(pk=1, test_int=1, test_char="a", test_float=1.0)
+        cache.set_many(TestModelA, {1: instance}, {1: "2015-01-01T00:00:00"})
+
+        found = cache.get_many(TestModelA, {1: "2015-01-01T00:00:00"})
+        self.assertEqual(found[1].test_char, "a")
+        self.assertIsNot(found[1], instance)
+        self.assertEqual(cache.get_many(TestModelA, {1: "2015-01-02T00:00:00"}), {})
+        self.assertEqual(cache.get_many(TestModelA, {1: None}), {})
+
+    def test_timeout_is_read_lazily(self):
+        cache = HydrationCache(backend=LRUCache())
+        with self.settings(ES_HYDRATION_CACHE_TIMEOUT=5):
+            self.assertEqual(cache.timeout, 5)
+        self.assertEqual(cache.timeout, 300)
@@ -0,0 +1,54 @@
+# tests/test_utils_conf.py
+# author: andrew young
+# email: ayoung@thewulf.org
+
+from django.test import TestCase
+
+from elasticmodels.utils.conf import ESIndex
+from elasticmodels.utils.sync import suppress_sync
+from elasticmodels.tests.test_elasticmodel import TestModelA, TestModelB
+from elasticmodels.tests.test_manager import FakeClient
+
+
+class MixedIndex(ESIndex):
+    """ an alias holding the doctypes of both test models, never initialized
+    """
+    name = "a-mixed-index"
+    initialized = True
+
+    @property
+    def models(self):
+        return [TestModelA, TestModelB]
+
+
+class TestingESIndexCase(TestCase):
+    def setUp(self):
+        with suppress_sync(TestModelA), suppress_sync(TestModelB):
+            self.a = TestModelA.objects.create(test_int=1, test_char="a",
+                test_float=1.0)
+            self.b = TestModelB.objects.create(test_int=2, test_char="b",
+                test_float=2.0)
+        self.client = FakeClient()
+        self.index = MixedIndex()
+        self.index.elasticsearch = self.client
+
+    def test_hits_of_mixed_doctypes_are_hydrated_in_order(self):
+        a_type = TestModelA._search_meta.doctype_name
+        b_type = TestModelB._search_meta.doctype_name
+        self.client.responses["search"] = {"hits": {"total": 4, "hits": [
+            {"_id": str(self.b.pk), "_type": b_type},
+            {"_id": "1", "_type": "unknown"},
+            {"_id": str(self.a.pk), "_type": a_type},
+            {"_id": "999", "_type": a_type}]}}
+
+        with self.assertNumQueries(2):
+            objects, raw_results = self.index.search_es(
+                body={"query": {"match_all": {}}})
+        self.assertEqual(objects, [self.b, self.a])
+        self.assertEqual([type(instance) for instance in objects],
+            [TestModelB, TestModelA])
+
+        request = self.client.requests[0][1]
+        self.assertEqual(request["index"], "a-mixed-index")
+        self.assertEqual(request["doc_type"], ",".join(sorted([a_type, b_type])))
+        self.assertIs(request["_source"], False)
@@ -0,0 +1,101 @@
+# tests/test_utils_dependencies.py
+# author: andrew young
+# email: ayoung@thewulf.org
+
+from django.db import models as dmod
+from django.test import TestCase, override_settings
+
+from elasticmodels.models import SearchableModel, IndexOutbox
+from elasticmodels.utils import sync
+from elasticmodels.utils.dependencies import DependencyTracker, tracker
+from elasticmodels.utils.sync import suppress_sync
+
+
+class Author(dmod.Model):
+    name = dmod.CharField(max_length=20)
+    bio = dmod.CharField(max_length=20)
+
+
+class Tag(dmod.Model):
+    name = dmod.CharField(max_length=20)
+
+
+class Book(SearchableModel):
+    class MappingMeta:
+        index_name = "a-cool-index"
+        fields = ["title"]
+        dependencies = {"author": ["name"], "tags": None}
+
+    title = dmod.CharField(max_length=20)
+    author = dmod.ForeignKey(Author)
+    tags = dmod.ManyToManyField(Tag)
+
+
+@override_settings(ES_OUTBOX=True)
+class TestingDependencyCase(TestCase):
+    def setUp(self):
+        with suppress_sync(Book):
+            author = Author.objects.create(name="a", bio="a")
+            self.book = Book.objects.create(title="a", author=author)
+            self.tag = Tag.objects.create(name="a")
+        self.author = Author.objects.get(pk=author.pk)
+        self.queued()
+
+    def queued(self, dependency_tracker=tracker):
+        """ the book pks queued for reindexing since the last call
+        """
+        dependency_tracker._committed()
+        pks = sorted(int(pk) for pk in IndexOutbox.objects.filter(
+            model="elasticmodels.Book").values_list("object_pk", flat=True))
+        IndexOutbox.objects.all().delete()
+        return pks
+
+    def test_only_changed_watched_fields_reindex(self):
+        self.author.bio = "b"
+        self.author.save()
+        self.assertEqual(self.queued(), [])
+        self.author.name = "b"
+        self.author.save()
+        self.assertEqual(self.queued(), [self.book.pk])
+        self.author.save()
+        self.assertEqual(self.queued(), [])
+
+    def test_many_to_many_changes_reindex(self):
+        self.book.tags.add(self.tag)
+        self.assertEqual(self.queued(), [self.book.pk])
+        self.tag.book_set.clear()
+        self.assertEqual(self.queued(), [self.book.pk])
+        self.book.tags.clear()
+        self.assertEqual(self.queued(), [self.book.pk])
+
+    def test_debounce_never_waits_past_the_max_wait(self):
+        dependency_tracker = DependencyTracker()
+        with override_settings(ES_DEPENDENCY_DEBOUNCE=60, ES_DEPENDENCY_MAX_WAIT=0):
+            dependency_tracker._local_state()[1][Book].add(self.book.pk)
+            self.assertEqual(self.queued(dependency_tracker), [self.book.pk])
+
+        with override_settings(ES_DEPENDENCY_DEBOUNCE=60):
+            dependency_tracker._local_state()[1][Book].add(self.book.pk)
+            self.assertEqual(self.queued(dependency_tracker), [])
+            self.assertIsNotNone(dependency_tracker._timer)
+            dependency_tracker.flush()
+            self.assertIsNone(dependency_tracker._timer)
+            self.assertEqual(self.queued(dependency_tracker), [self.book.pk])
+
+    def test_deletes_are_resolved_once_per_edge_on_commit(self):
+        authors = [Author.objects.create(name=str(i), bio="") for i in range(3)]
+        callbacks = []
+        on_commit = sync.on_commit
+        sync.on_commit = lambda func, using=None: callbacks.append(func)
+        try:
+            Author.objects.filter(pk__in=[a.pk for a in authors]).delete()
+        finally:
+            sync.on_commit = on_commit
+
+        dependency, = [dependency for dependency in
+            Book._search_meta.dependencies if dependency.path == "author"]
+        self.assertEqual(dict(tracker._local_state()[0]),
+            {dependency: set(author.pk for author in authors)})
+        with self.assertNumQueries(1):
+            for callback in callbacks:
+                callback()
@@ -0,0 +1,71 @@
+# tests/test_utils_fields.py
+# author: andrew young
+# email: ayoung@thewulf.org
+
+import json
+
+from django.db import connection, models as dmod
+from django.test import TestCase
+
+from elasticmodels.models import SearchableModel
+from elasticmodels.utils.fields import JSONField
+from elasticmodels.utils.serializers import LazyJSON, ValuesSerializer
+from elasticmodels.utils.sync import suppress_sync
+
+
+RAW = '{"tags": ["a", "b"],  "count": 2}'
+
+
+class JSONDocument(SearchableModel):
+    class MappingMeta:
+        index_name = "a-cool-index"
+        fields = ["title", "data"]
+
+    title = dmod.CharField(max_length=10)
+    data = JSONField(default=dict)
+
+
+class TestingJSONFieldCase(TestCase):
+    def setUp(self):
+        with suppress_sync(JSONDocument):
+            self.pk = JSONDocument.objects.create(title="a").pk
+        with connection.cursor() as cursor:
+            cursor.execute("UPDATE {0} SET data = %s".format(
+                JSONDocument._meta.db_table), [RAW])
+
+    def test_values_are_decoded_on_first_access(self):
+        instance = JSONDocument.objects.get(pk=self.pk)
+        self.assertIsInstance(instance.__dict__["data"], LazyJSON)
+        self.assertEqual(instance.data, json.loads(RAW))
+        self.assertEqual(instance.__dict__["data"], json.loads(RAW))
+
+    def test_values_queries_read_the_raw_json(self):
+        self.assertEqual(list(JSONDocument.objects.values_list("data", flat=True)),
+            [RAW])
+        self.assertEqual(JSONDocument.objects.values("data")[0], {"data": RAW})
+
+    def test_untouched_values_are_written_back_as_read(self):
+        instance = JSONDocument.objects.get(pk=self.pk)
+        field = JSONDocument._meta.get_field("data")
+        value = field.pre_save(instance, False)
+        self.assertEqual(field.get_db_prep_value(value, connection), RAW)
+        with suppress_sync(JSONDocument):
+            instance.save()
+        self.assertIsInstance(instance.__dict__["data"], LazyJSON)
+
+        instance.data["count"] = 3
+        with suppress_sync(JSONDocument):
+            instance.save()
+        self.assertEqual(JSONDocument.objects.get(pk=self.pk).data["count"], 3)
+
+    def test_raw_json_is_embedded_in_documents(self):
+        instance = JSONDocument.objects.get(pk=self.pk)
+        document = instance.es_serialized
+        self.assertIn('"data":{0}'.format(RAW), document)
+        self.assertEqual(json.loads(document)["data"], json.loads(RAW))
+        self.assertIsInstance(instance.__dict__["data"], LazyJSON)
+
+        serializer = ValuesSerializer(JSONDocument)
+        rows = list(serializer.values(JSONDocument.objects.all()))
+        (pk, row, body), = serializer.serialize_rows(rows)
+        self.assertEqual(body, document)
@@ -0,0 +1,68 @@
+# tests/test_utils_migration.py
+# author: andrew young
+# email: ayoung@thewulf.org
+
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+
+from elasticmodels.utils.migration import (BULK_LOAD_SETTINGS,
+    SearchableModelMigrationManager)
+from elasticmodels.tests.test_manager import FakeClient
+from elasticmodels.tests.test_utils_conf import MixedIndex
+
+
+class FakeIndices(object):
+    """ an indices client holding the settings of a single index
+    """
+    def __init__(self, settings):
+        self.settings = settings
+        self.put = []
+        self.merged = []
+
+    def get_settings(self, index):
+        return {index: {"settings": {"index": self.settings}}}
+
+    def put_settings(self, index, body):
+        self.put.append(body["index"])
+
+    def forcemerge(self, index, max_num_segments=None):
+        self.merged.append(index)
+
+
+class TestingBulkLoadCase(TestCase):
+    def setUp(self):
+        self.indices = FakeIndices({"refresh_interval": "30s",
+            "number_of_replicas": "2", "translog": {"durability": "request"}})
+        client = FakeClient()
+        client.indices = self.indices
+        self.manager = SearchableModelMigrationManager("a-cool-index")
+        self.manager.elasticsearch = client
+
+    def test_settings_are_restored_when_the_load_raises(self):
+        def load():
+            with self.manager.bulk_load("a-cool-index_1", wait_for_status=None):
+                raise ValueError("rejected")
+
+        self.assertRaises(ValueError, load)
+        self.assertEqual(self.indices.put, [BULK_LOAD_SETTINGS, {
+            "refresh_interval": "30s", "number_of_replicas": "2",
+            "translog.durability": "request"}])
+        self.assertEqual(self.indices.merged, [])
+
+    def test_the_index_is_merged_after_a_load(self):
+        with self.manager.bulk_load("a-cool-index_1", wait_for_status=None) as index:
+            self.assertEqual(self.indices.put, [BULK_LOAD_SETTINGS])
+        self.assertEqual(len(self.indices.put), 2)
+        self.assertEqual(self.indices.merged, [index])
+
+
+class TestingMigrateIndexCommandCase(TestCase):
+    def test_only_role_back_is_passed_on(self):
+        index = MixedIndex()
+        migrations = []
+        index.migrate_index = lambda **kwargs: migrations.append(kwargs)
+        with override_settings(ES_INSTALLED_INDICES=[index]):
+            call_command("migrate_index", index.name)
+            call_command("migrate_index", index.name, role_back=True)
+        self.assertEqual([kwargs["role_back"] for kwargs in migrations],
+            [None, True])
@@ -0,0 +1,80 @@
+# tests/test_utils_outbox.py
+# author: andrew young
+# email: ayoung@thewulf.org
+
+from django.test import TestCase, override_settings
+
+from elasticsearch.exceptions import ConnectionError
+
+from elasticmodels.models import IndexOutbox
+from elasticmodels.utils import outbox
+from elasticmodels.utils.sync import suppress_sync
+from elasticmodels.tests.test_elasticmodel import TestModelA
+
+
+LABEL = "elasticmodels.TestModelA"
+
+
+@override_settings(ES_OUTBOX=True, ES_OUTBOX_MAX_ATTEMPTS=2)
+class TestingOutboxCase(TestCase):
+    def setUp(self):
+        with suppress_sync(TestModelA):
+            self.instances = [TestModelA.objects.create(test_int=i,
+                test_char=str(i), test_float=i / 2.0) for i in range(3)]
+        self.shipped = []
+        self.failing = set()
+        self._ship, outbox.ship = outbox.ship, self.ship
+
+    def tearDown(self):
+        outbox.ship = self._ship
+
+    def ship(self, model, operations):
+        """ records the operations, and fails for the pks in `failing`
+        """
+        for op, documents in operations.items():
+            if self.failing.intersection(documents):
+                raise ValueError("rejected")
+        self.shipped.append(operations)
+
+    def test_enqueue_and_collapse(self):
+        outbox.enqueue(self.instances[0], outbox.INDEX)
+        outbox.enqueue_many(TestModelA, [self.instances[0].pk,
+            self.instances[1].pk], outbox.DELETE)
+        outbox.enqueue(self.instances[1], outbox.INDEX)
+        rows = IndexOutbox.objects.all()
+        self.assertEqual(len(rows), 4)
+
+        operations = outbox.collapse(rows)[LABEL]
+        self.assertEqual(list(operations[outbox.INDEX]), [str(self.instances[1].pk)])
+        self.assertEqual(list(operations[outbox.DELETE]),
+            [str(self.instances[0].pk)])
+
+    def test_drain_ships_and_removes_the_rows(self):
+        outbox.enqueue_many(TestModelA, [i.pk for i in self.instances], outbox.INDEX)
+        self.assertEqual(outbox.drain(), 3)
+        self.assertEqual(len(self.shipped), 1)
+        self.assertFalse(IndexOutbox.objects.exists())
+        self.assertEqual(outbox.drain(), 0)
+
+    def test_failing_rows_are_dead_lettered(self):
+        outbox.enqueue_many(TestModelA, [i.pk for i in self.instances], outbox.INDEX)
+        self.failing.add(str(self.instances[0].pk))
+
+        self.assertEqual(outbox.drain(), 3)
+        row = IndexOutbox.objects.get()
+        self.assertEqual((row.object_pk, row.attempts), (str(self.instances[0].pk), 1))
+        self.assertIn("rejected", row.last_error)
+
+        self.assertEqual(outbox.drain(), 1)
+        self.assertEqual(list(outbox.dead_letters()), [row])
+        self.assertEqual(outbox.drain(), 0)
+
+    def test_unreachable_cluster_keeps_the_rows(self):
+        outbox.enqueue_many(TestModelA, [i.pk for i in self.instances], outbox.INDEX)
+
+        def unreachable(model, operations):
+            raise ConnectionError("N/A", "unreachable", None)
+        outbox.ship = unreachable
+
+        self.assertRaises(ConnectionError, outbox.drain)
+        self.assertEqual(IndexOutbox.objects.filter(attempts=0).count(), 3)
@@ -0,0 +1,40 @@
+# -*- coding: utf-8 -*-
+# tests/test_utils_profiling.py
+# author: andrew young
+# email: ayoung@thewulf.org
+
+from __future__ import unicode_literals
+
+from django.test import TestCase
+
+from elasticsearch.serializer import JSONSerializer
+
+from elasticmodels.utils.profiling import profiled_search
+
+
+RESPONSE = '{"took": 3, "hits": {"total": 0, "hits": []}, "name": "café"}'
+
+
+class Connection(object):
+    def perform_request(self, method, url, params=None, body=None):
+        return 200, {}, RESPONSE
+
+
+class Transport(object):
+    serializer = JSONSerializer()
+
+    def get_connection(self):
+        return Connection()
+
+
+class Client(object):
+    transport = Transport()
+
+
+class TestingProfilingCase(TestCase):
+    def test_response_bytes_are_counted_encoded(self):
+        raw_results, profile = profiled_search(Client(), index="a-cool-index",
+            body={"query": {"match_all": {}}})
+        self.assertEqual(raw_results["name"], "café")
+        self.assertEqual(profile.response_bytes, len(RESPONSE) + 1)
+        self.assertEqual(profile.timings["es_took"], 3.0)
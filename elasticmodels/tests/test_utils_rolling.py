@@ -0,0 +1,67 @@
+# tests/test_utils_rolling.py
+# author: andrew young
+# email: ayoung@thewulf.org
+
+import time
+from datetime import timedelta
+
+from django.test import TestCase
+from django.utils import timezone
+
+from elasticmodels.utils.aliasing import revision_number
+from elasticmodels.utils.bulk import ChunkSerializer
+from elasticmodels.utils.conf import RollingIndex
+from elasticmodels.utils.sync import suppress_sync
+from elasticmodels.tests.test_elasticmodel import TestModelA
+
+
+class Buckets(object):
+    """ stands in for a `RollingIndex` whose older bucket holds the first row
+    """
+    def __init__(self, pk):
+        self.pk = pk
+
+    def owning_indices(self, doctype_name, pks):
+        return {str(self.pk): "events-000001"}
+
+
+class EventIndex(RollingIndex):
+    """ a rolling index of two buckets split at `split`, never initialized
+    """
+    name = "events"
+    initialized = True
+
+    def __init__(self, split):
+        super(EventIndex, self).__init__()
+        self._buckets = [("events-000001", None, split),
+            ("events-000002", split, None)]
+        self._buckets_expire = time.time() + self.buckets_ttl
+
+
+class TestingRollingIndexCase(TestCase):
+    def test_revision_numbers(self):
+        self.assertEqual(revision_number("events_3"), 3)
+        self.assertEqual(revision_number("events-000002"), 2)
+        self.assertEqual(revision_number("events"), 0)
+
+    def test_actions_go_to_the_owning_bucket(self):
+        with suppress_sync(TestModelA):
+            first = TestModelA.objects.create(test_int=1, test_char="a",
+                test_float=1.0)
+            TestModelA.objects.create(test_int=2, test_char="b", test_float=2.0)
+        for op_type, first_index in (("index", "events-000001"),
+                ("create", "a-cool-index")):
+            chunker = ChunkSerializer(TestModelA.objects.all(), op_type=op_type)
+            chunker.rolling_index = Buckets(first.pk)
+            indices = [action["_index"] for chunk in chunker for action in chunk]
+            self.assertEqual(indices, [first_index, "a-cool-index"])
+
+
+    def test_ranges_without_buckets_return_no_hits(self):
+        split = timezone.now()
+        index = EventIndex(split)
+        empty = {"hits": {"total": 0, "hits": []}}
+        start, end = split + timedelta(hours=1), split - timedelta(hours=1)
+        self.assertEqual(index.indices_for_range(end=end), ["events-000001"])
+        self.assertEqual(index.search_es(start=start, end=end, raw_only=True), empty)
+        self.assertEqual(index.search_es(start=start, end=end), ([], empty))
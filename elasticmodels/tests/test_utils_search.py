@@ -0,0 +1,149 @@
+# tests/test_utils_search.py
+# author: andrew young
+# email: ayoung@thewulf.org
+
+from django.core.paginator import Paginator
+from django.test import TestCase
+
+from elasticmodels.utils.search import ElasticQuerySet
+from elasticmodels.utils.sync import suppress_sync
+from elasticmodels.tests.test_elasticmodel import TestModelA, TestModelB
+from elasticmodels.tests.test_manager import FakeClient, id_hits
+
+
+class FakeManager(object):
+    """ records the requests an ElasticQuerySet makes instead of sending them
+    """
+    model = TestModelA
+
+    def __init__(self, total=50):
+        self.total = total
+        self.searches = []
+        self.counts = []
+
+    def search(self, body=None, **kwargs):
+        self.searches.append(body)
+        start = body.get("from", 0)
+        stop = min(start + body.get("size", 10), self.total)
+        hits = [{"_id": str(pk)} for pk in range(start, stop)]
+        return {"hits": {"total": self.total, "hits": hits}}
+
+    def count_es(self, query=None, **kwargs):
+        self.counts.append(query)
+        return self.total
+
+
+class TestingElasticQuerySetCase(TestCase):
+    def setUp(self):
+        self.manager = FakeManager()
+        self.queryset = ElasticQuerySet(self.manager, {"match_all": {}})
+
+    def test_is_lazy_and_chainable(self):
+        queryset = self.queryset.filter({"term": {"test_int": 1}}).sort("-test_int")
+        self.assertEqual(self.manager.searches, [])
+        self.assertEqual(queryset.to_body(), {
+            "_source": False,
+            "query": {"bool": {"must": {"match_all": {}},
+                "filter": [{"term": {"test_int": 1}}]}},
+            "sort": [{"test_int": {"order": "desc"}}]})
+        self.assertEqual(self.queryset.to_body()["query"], {"match_all": {}})
+
+    def test_slices_become_from_and_size(self):
+        self.queryset[10:30]
+        self.assertEqual(len(self.manager.searches), 1)
+        self.assertEqual(self.manager.searches[0]["from"], 10)
+        self.assertEqual(self.manager.searches[0]["size"], 20)
+
+    def test_slices_inside_a_fetched_window_are_reused(self):
+        self.queryset[10:30]
+        self.queryset[15:20]
+        self.queryset[10:30]
+        self.assertEqual(len(self.manager.searches), 1)
+        self.queryset[25:35]
+        self.assertEqual(len(self.manager.searches), 2)
+
+    def test_count_uses_count_api_until_the_total_is_known(self):
+        self.assertEqual(len(self.queryset), 50)
+        self.assertEqual(len(self.manager.counts), 1)
+
+        queryset = self.queryset.query({"match": {"test_char": "hello"}})
+        queryset[0:10]
+        self.assertEqual(queryset.count(), 50)
+        self.assertEqual(len(self.manager.counts), 1)
+
+    def test_missing_rows_keep_the_window_offsets(self):
+        with suppress_sync(TestModelA):
+            for pk in (1, 3, 5, 6):
+                TestModelA.objects.create(pk=pk, test_int=pk, test_char=str(pk),
+                    test_float=pk / 2.0)
+        self.assertEqual([i.pk for i in self.queryset[0:10]], [1, 3, 5, 6])
+        self.assertEqual([i.pk for i in self.queryset[4:7]], [5, 6])
+        self.assertEqual(self.queryset[3].pk, 3)
+        self.assertRaises(IndexError, lambda: self.queryset[2])
+        self.assertEqual(len(self.manager.searches), 1)
+
+    def test_iteration_keeps_a_bounded_number_of_windows(self):
+        self.queryset.page_size = 2
+        list(self.queryset)
+        self.assertEqual(len(self.manager.searches), 25)
+        self.assertEqual(len(self.queryset._windows), self.queryset.max_windows)
+
+    def test_counts_through_a_real_manager(self):
+        with suppress_sync(TestModelA):
+            pks = [TestModelA.objects.create(test_int=i, test_char=str(i),
+                test_float=i / 2.0).pk for i in range(3)]
+        client = FakeClient(count={"count": 3}, search=lambda body, **kwargs:
+            id_hits(pks[body["from"]:body["from"] + body["size"]]))
+        TestModelA.objects.elasticsearch = client
+        try:
+            queryset = TestModelA.objects.query_es({"match_all": {}})
+            self.assertEqual((len(queryset), bool(queryset)), (3, True))
+            self.assertEqual([i.pk for i in queryset.query(None)[1:]], pks[1:])
+            page = Paginator(queryset.sort("test_int"), 2).page(2)
+            self.assertEqual([i.pk for i in page], pks[2:])
+        finally:
+            TestModelA.objects._elastic = None
+        self.assertEqual([method for method, kwargs in client.requests],
+            ["count", "count", "search", "count", "search"])
+        self.assertEqual(client.requests[0][1]["body"],
+            {"query": {"match_all": {}}})
+
+
+class TestingMultiSearchCase(TestCase):
+    def setUp(self):
+        with suppress_sync(TestModelA), suppress_sync(TestModelB):
+            self.a = [TestModelA.objects.create(test_int=i, test_char=str(i),
+                test_float=i / 2.0) for i in range(3)]
+            self.b = TestModelB.objects.create(test_int=1, test_char="1",
+                test_float=0.5)
+        self.client = FakeClient()
+        TestModelA.objects.elasticsearch = self.client
+
+    def tearDown(self):
+        TestModelA.objects._elastic = None
+
+    def test_errors_stay_with_their_search_and_the_rest_is_hydrated(self):
+        error = {"type": "query_shard_exception", "reason": "failed"}
+        self.client.responses["msearch"] = {"responses": [
+            id_hits([self.a[2].pk, self.a[0].pk]), {"error": error},
+            id_hits([self.b.pk]), id_hits([self.a[1].pk])]}
+
+        batch = TestModelA.objects.multi_search()
+        batch.add({"query": {"match_all": {}}})
+        batch.add({"query": {"bogus": {}}})
+        batch.add({"query": {"match_all": {}}}, model=TestModelB)
+        batch.add({"query": {"match_all": {}}}, raw_only=True)
+        with self.assertNumQueries(2):
+            a, failed, b, raw = batch.execute()
+
+        self.assertEqual([i.pk for i in a], [self.a[2].pk, self.a[0].pk])
+        self.assertEqual((failed.ok, failed.error, len(failed)), (False, error, 0))
+        self.assertEqual([i.pk for i in b], [self.b.pk])
+        self.assertEqual((raw.pks, raw.objects), ([self.a[1].pk], []))
+
+        request = self.client.requests[0][1]["body"]
+        self.assertEqual(len(request), 8)
+        self.assertEqual(request[4]["type"], TestModelB._search_meta.doctype_name)
+        self.assertIs(request[1]["_source"], False)
+        self.assertNotIn("_source", request[7])
+        self.assertEqual(len(batch), 0)
@@ -0,0 +1,41 @@
+# tests/test_utils_singleflight.py
+# author: andrew young
+# email: ayoung@thewulf.org
+
+import threading
+import time
+
+from django.test import TestCase
+
+from elasticmodels.utils.singleflight import SingleFlight, request_key
+
+
+class TestingSingleFlightCase(TestCase):
+    def test_waiters_share_the_leaders_result(self):
+        flight = SingleFlight()
+        calls = []
+
+        def search():
+            calls.append(1)
+            return {"hits": {"hits": [1, 2]}}
+
+        key = request_key("index", {"query": {"match_all": {}}})
+        call, leader = flight.begin(key)
+        results = []
+        waiters = [threading.Thread(target=lambda: results.append(flight.do(key,
+            search))) for _ in range(3)]
+        for waiter in waiters:
+            waiter.start()
+        while call.waiters < 3:
+            time.sleep(0.001)
+
+        leader_result = flight.run(key, call, search)
+        for waiter in waiters:
+            waiter.join()
+
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(results, [leader_result] * 3)
+        results[0]["hits"]["hits"].append(3)
+        self.assertEqual(leader_result["hits"]["hits"], [1, 2])
+        self.assertEqual(flight.metrics(), {"requests": 4, "coalesced": 3,
+            "errors": 0})
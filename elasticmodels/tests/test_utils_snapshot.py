@@ -0,0 +1,38 @@
+# tests/test_utils_snapshot.py
+# author: andrew young
+# email: ayoung@thewulf.org
+
+import os
+import shutil
+import tempfile
+
+from django.test import TestCase
+
+from elasticsearch.exceptions import TransportError
+
+from elasticmodels.utils.snapshot import export_alias
+from elasticmodels.tests.test_manager import FakeClient
+
+
+def scroll_slice(body, **kwargs):
+    """ a single page of hits for the first slice, the second one fails
+    """
+    if body["slice"]["id"] == 1:
+        raise TransportError(500, "search_phase_execution_exception")
+    return {"_shards": {"successful": 1, "total": 1}, "hits": {"hits": [
+        {"_type": "testmodela", "_id": "1", "_source": {"test_int": 1}}]}}
+
+
+class TestingSnapshotCase(TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, "a-cool-index.ndjson")
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_a_failing_slice_fails_the_export(self):
+        client = FakeClient(search=scroll_slice)
+        self.assertRaises(TransportError, export_alias, client, "a-cool-index",
+            self.path, slices=2)
+        self.assertEqual(len(client.requests), 2)
@@ -0,0 +1,54 @@
+# tests/test_utils_suggest.py
+# author: andrew young
+# email: ayoung@thewulf.org
+
+from django.test import TestCase
+
+from elasticmodels.utils.mapping import SuggestField
+from elasticmodels.utils.suggest import (SuggestCache, parse_suggestions,
+    suggest_body)
+from elasticmodels.tests.test_elasticmodel import TestModelA
+
+
+class TestingSuggestCase(TestCase):
+    def test_suggest_field_mapping_and_inputs(self):
+        field = SuggestField("char_suggest", "test_char", payload=["test_char"],
+            analyzer="simple")
+        self.assertEqual(field.field_mapping, {"type": "completion",
+            "analyzer": "simple"})
+        self.assertEqual(field.inputs("abc"), {"input": ["abc"]})
+        self.assertEqual(field.inputs(["a", None, "b"]), {"input": ["a", "b"]})
+        self.assertIsNone(field.inputs(""))
+
+    def test_suggestions_are_parsed_without_hydration(self):
+        field = SuggestField("char_suggest", "test_char", payload=["test_char"])
+        body = suggest_body(field, "ab", size=5)
+        self.assertEqual(body["_source"], ["test_char"])
+        self.assertEqual(body["suggest"]["suggestion"]["completion"],
+            {"field": "char_suggest", "size": 5})
+
+        response = {"suggest": {"suggestion": [{"text": "ab", "options": [
+            {"text": "abc", "_id": "3", "_score": 2.0,
+                "_source": {"test_char": "abc"}}]}]}}
+        self.assertEqual(parse_suggestions(TestModelA, response),
+            [{"text": "abc", "pk": 3, "score": 2.0, "test_char": "abc"}])
+
+    def test_bumping_the_generation_invalidates(self):
+        cache = SuggestCache(maxsize=10)
+        key = cache.key(TestModelA, "Ab", "char_suggest", 5, None)
+        cache.set(key, [{"text": "abc"}])
+        self.assertEqual(cache.get(cache.key(TestModelA, "ab", "char_suggest", 5,
+            None)), [{"text": "abc"}])
+        cache.bump(TestModelA)
+        self.assertIsNone(cache.get(cache.key(TestModelA, "ab", "char_suggest", 5,
+            None)))
+
+    def test_settings_are_read_lazily(self):
+        cache = SuggestCache(maxsize=10)
+        key = cache.key(TestModelA, "ab", "char_suggest", 5, None)
+        cache.set(key, [{"text": "abc"}])
+        with self.settings(ES_SUGGEST_CACHE_TTL=-1,
+                ES_SUGGEST_CACHE_PREFIX_LENGTH=1):
+            self.assertIsNone(cache.get(key))
+            self.assertFalse(cache.cacheable("ab"))
+        self.assertEqual(cache.get(key), [{"text": "abc"}])
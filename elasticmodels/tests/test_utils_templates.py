@@ -0,0 +1,55 @@
+# tests/test_utils_templates.py
+# author: andrew young
+# email: ayoung@thewulf.org
+
+import json
+
+from django.test import TestCase
+
+from elasticmodels.utils.templates import (SearchTemplate, TemplateRegistry,
+    TemplateParamError)
+
+
+class TestingSearchTemplatesCase(TestCase):
+    def setUp(self):
+        self.body = {"query": {"match": {"title": "{{title}}"}}, "size": "{{size}}"}
+
+    def test_placeholders_are_rendered_as_json(self):
+        template = SearchTemplate("by_title", self.body)
+        self.assertEqual(template.params, set(["title", "size"]))
+        body = json.loads(template.render({"title": "django", "size": 5}))
+        self.assertEqual(body["query"]["match"]["title"], "django")
+        self.assertEqual(body["size"], 5)
+        self.assertRaises(TemplateParamError, template.render, {"title": "django"})
+
+    def test_mustache_source(self):
+        template = SearchTemplate("by_title", self.body)
+        self.assertIn('"size":{{#toJson}}size{{/toJson}}', template.mustache())
+
+    def test_registry_ids_and_stored_request_body(self):
+        registry = TemplateRegistry("articles.article", {"by_title": self.body})
+        self.assertEqual(registry.request_body("by_title", {"size": 1}),
+            {"id": "articles.article.by_title",
+                "params": {"size": 1, "_source": True}})
+        self.assertEqual(registry.render("by_title", {"title": "a", "size": 1}),
+            registry.render("by_title", {"size": 1, "title": "a"}))
+
+    def test_source_follows_ids_only(self):
+        registry = TemplateRegistry("articles.article", {"by_title": self.body,
+            "titles": dict(self.body, _source=["title"])})
+        params = {"title": "a", "size": 1}
+        self.assertNotIn("_source", registry.get("by_title").params)
+        self.assertEqual(json.loads(registry.render("by_title", params))["_source"],
+            True)
+        self.assertEqual(json.loads(registry.render("by_title", params,
+            ids_only=True))["_source"], False)
+        self.assertEqual(registry.request_body("by_title", params,
+            ids_only=True)["params"]["_source"], False)
+        self.assertEqual(json.loads(registry.render("titles", params,
+            ids_only=True))["_source"], ["title"])
+
+    def test_stored_is_read_lazily(self):
+        registry = TemplateRegistry("articles.article")
+        with self.settings(ES_STORED_TEMPLATES=True):
+            self.assertTrue(registry.stored)
+        self.assertFalse(registry.stored)
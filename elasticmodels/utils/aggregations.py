@@ -0,0 +1,94 @@
+# utils/aggregations.py
+# author: andrew young
+# email: ayoung@thewulf.org
+
+import copy
+import datetime
+
+from django.utils import timezone
+
+from elasticmodels.utils.hydration import hit_pk
+
+
+BUCKET_AGGREGATIONS = ("terms", "range", "date_range", "histogram", "date_histogram")
+PKS_AGGREGATION = "_pks"
+
+
+def _aggregation_type(request):
+    """ the type of an aggregation request, ie "terms" for {"terms": {...}}
+    """
+    for key in request:
+        if key not in ("aggs", "aggregations", "meta"):
+            return key
+
+
+def _sub_aggregations(request):
+    return request.get("aggs", request.get("aggregations", {}))
+
+
+def with_bucket_pks(aggs, size):
+    """ returns a copy of the `aggs` request where every bucket aggregation carries
+    a `top_hits` sub aggregation that only returns the `_id` of up to `size` hits.
+    """
+    aggs = copy.deepcopy(aggs)
+    for request in aggs.values():
+        sub_aggs = _sub_aggregations(request)
+        if _aggregation_type(request) in BUCKET_AGGREGATIONS:
+            sub_aggs[PKS_AGGREGATION] = {"top_hits": {"size": size, "_source": False}}
+        if sub_aggs:
+            request.pop("aggregations", None)
+            request["aggs"] = with_bucket_pks(sub_aggs, size)
+    return aggs
+
+
+def _parse_bucket(agg_type, bucket, request, model):
+    parsed = {"key": bucket.get("key"), "count": bucket["doc_count"]}
+    if agg_type == "date_histogram":
+        parsed["key"] = datetime.datetime.fromtimestamp(bucket["key"] / 1000.0,
+            tz=timezone.utc)
+    if agg_type in ("range", "date_range"):
+        parsed["from"] = bucket.get("from")
+        parsed["to"] = bucket.get("to")
+    if "key_as_string" in bucket:
+        parsed["key_as_string"] = bucket["key_as_string"]
+
+    if PKS_AGGREGATION in bucket and model is not None:
+        hits = bucket[PKS_AGGREGATION]["hits"]["hits"]
+        parsed["pks"] = [hit_pk(model, hit) for hit in hits]
+
+    sub_aggregations = parse_aggregations(_sub_aggregations(request), bucket, model)
+    if sub_aggregations:
+        parsed["aggregations"] = sub_aggregations
+    return parsed
+
+
+def parse_aggregations(aggs, response, model=None):
+    """ turns the `aggregations` of an elasticsearch response into python
+    structures. bucket aggregations become a list of dicts with at least a `key`
+    and a `count` (date_histogram keys are aware datetimes, ranges carry `from` and
+    `to`), single value metrics become their value and everything else is returned
+    untouched.
+
+    :param aggs: the aggregations of the request, used to tell the types apart
+    :param response: the `aggregations` of the response
+    :param model: when given, buckets with pk hits (see `with_bucket_pks`) get a
+        `pks` list for drilling down
+    """
+    parsed = {}
+    for name, request in aggs.items():
+        if name == PKS_AGGREGATION or name not in response:
+            continue
+        result = response[name]
+        agg_type = _aggregation_type(request)
+        if "buckets" in result:
+            buckets = result["buckets"]
+            if isinstance(buckets, dict):
+                # keyed responses
+                buckets = [dict(bucket, key=key) for key, bucket in buckets.items()]
+            parsed[name] = [_parse_bucket(agg_type, bucket, request, model)
+                for bucket in buckets]
+        elif set(result) <= set(["value", "value_as_string"]):
+            parsed[name] = result.get("value")
+        else:
+            parsed[name] = result
+    return parsed
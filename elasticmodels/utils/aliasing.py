@@ -2,13 +2,74 @@
 # author: andrew young
 # email: ayoung@thewulf.org
 
+import re
+import threading
+import time
+
 from django.conf import settings
 
+from elasticsearch.exceptions import NotFoundError
 from elasticsearch.helpers import reindex
 
 from .elasticobject import ElasticObject
 
 
+REVISION = re.compile(r"[_-](\d+)$")
+
+
+class AliasCache(object):
+    """ a process wide cache of which physical indices each alias points at.
+    the library invalidates an alias whenever it changes it, `ttl` (the
+    `ES_ALIAS_CACHE_TTL` setting, in seconds) bounds how long changes made from
+    elsewhere can go unnoticed. a missing alias is cached as an empty list, any
+    other error propagates.
+    """
+    def __init__(self):
+        self._cache = {}
+        self._lock = threading.Lock()
+
+    @property
+    def ttl(self):
+        return getattr(settings, "ES_ALIAS_CACHE_TTL", 30)
+
+    def get_indices(self, elasticsearch, alias):
+        """ the sorted names of the indices `alias` points at
+        """
+        key = (id(elasticsearch), alias)
+        cached = self._cache.get(key)
+        if cached is not None and cached[1] > time.time():
+            return cached[0]
+
+        try:
+            indices = sorted(elasticsearch.indices.get_alias(name=alias).keys())
+        except NotFoundError:
+            indices = []
+        with self._lock:
+            self._cache[key] = (indices, time.time() + self.ttl)
+        return indices
+
+    def invalidate(self, alias=None):
+        """ forgets `alias`, or every alias when None
+        """
+        with self._lock:
+            if alias is None:
+                self._cache.clear()
+            else:
+                for key in [key for key in self._cache if key[1] == alias]:
+                    del self._cache[key]
+
+
+alias_cache = AliasCache()
+
+
+def revision_number(index_name):
+    """ the revision of a `<alias>_<revision>` index name, or the generation of a
+    `<alias>-000002` rollover index
+    """
+    match = REVISION.search(index_name)
+    return int(match.group(1)) if match else 0
+
+
 class AliasedIndex(ElasticObject):
     """
     """
@@ -19,16 +80,15 @@ class AliasedIndex(ElasticObject):
     @property
     def alias_exists(self):
         # perhaps the alias has been setup, but it is not pointing to this index yet
-        return self.elasticsearch.indices.exists_alias(self.alias_name)
+        return bool(alias_cache.get_indices(self.elasticsearch, self.alias_name))
 
     @property
     def current_revision_number(self):
-        revision_number = 0
-        if self.alias_exists:
-            index_name = "{alias}_*".format(alias=self.alias_name)
-            current = self.elasticsearch.indices.get_alias(index=index_name, name=self.alias_name).keys()[0]
-            revision_number = int(current.rsplit("_", 1)[-1])
-        return revision_number
+        revision = 0
+        indices = alias_cache.get_indices(self.elasticsearch, self.alias_name)
+        if indices:
+            revision = max(revision_number(index) for index in indices)
+        return revision
 
     def get_index_name(self, revision_number=0):
         return "{alias}_{revision}".format(alias=self.alias, revision=str(revision_number))
@@ -53,6 +113,7 @@ class AliasedIndex(ElasticObject):
 
         self.elasticsearch.indices.put_alias(
             index=self.index_name, name=self.alias_name)
+        alias_cache.invalidate(self.alias_name)
 
     def increment_index(self, mappings, settings=None):
         pass
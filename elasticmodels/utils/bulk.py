@@ -2,17 +2,22 @@
 # author: andrew young
 # email: ayoung@thewulf.org
 
+import sys
+import threading
 from sys import maxsize as maxint
 from functools import partial
 from collections import deque
 import json
 
-from django.db.models import Min, Max
+from django.conf import settings
+from django.utils import six
+from django.utils.six.moves import queue
 
-from elasticsearch.helpers import bulk as es_bulk_op
+from elasticsearch.helpers import bulk as es_bulk_op, BulkIndexError
 
-from elasticmodels import connect
-from elasticmodels.utils.serializers import JSONEncoder
+from elasticmodels import get_connection
+from elasticmodels.utils.serializers import (JSONEncoder, ValuesSerializer,
+    dump_document)
 
 
 class ChunkSerializer(object):
@@ -23,12 +28,33 @@ class ChunkSerializer(object):
     for more details.
     """
     chunk_size = 100
+    values = None
 
-    def __init__(self, queryset, op_type="update"):
-        self.querysets = queryset_chunker(queryset, self.chunk_size)
-        self.container = deque(maxlen=self.chunk_size)
+    def __init__(self, queryset, op_type="update", fields=None, pks=None,
+            chunk_size=None, values=None):
+        """
+        :param fields: only serialize these mapped fields, for partial `update` docs
+        :param pks: only serialize the rows of `queryset` with these pks
+        :param values: build the documents from `values()` rows instead of model
+            instances, see `ValuesSerializer`. defaults to `ES_VALUES_SERIALIZATION`
+        """
+        if chunk_size is not None:
+            self.chunk_size = chunk_size
+        if values is not None:
+            self.values = values
+        elif self.values is None:
+            self.values = getattr(settings, "ES_VALUES_SERIALIZATION", False)
         self.op_type = op_type
-        self.source_label = "_source" if self.op_type == "index" else "doc"
+        self.fields = fields
+        self.rolling_index = queryset.model._search_meta.rolling_index
+        self.values_serializer = None
+        if self.values and op_type != "delete" and \
+                ValuesSerializer.supports(queryset.model):
+            self.values_serializer = ValuesSerializer(queryset.model, fields=fields)
+            queryset = self.values_serializer.values(queryset)
+        self.querysets = queryset_chunker(queryset, self.chunk_size, pks=pks)
+        self.container = deque(maxlen=self.chunk_size)
+        self.source_label = "doc" if self.op_type == "update" else "_source"
         self._chunker = None
 
     def __iter__(self):
@@ -41,46 +67,332 @@ class ChunkSerializer(object):
 
     def get_chunk(self):
         for queryset in self.querysets:
-            self.container.extend(self._serialize_action(instance) for instance in
-                queryset)
+            self.container.extend(self.serialize_chunk(queryset))
             yield self.container
             self.container.clear()
 
-    def _serialize_action(self, instance):
+    def serialize_chunk(self, rows):
+        """ the actions of a chunk of instances, or of `values()` rows
+        """
+        return self.encode_chunk(self.fetch_chunk(rows))
+
+    def fetch_chunk(self, rows):
+        """ the actions of a chunk with their documents still as dicts. every
+        database query of the serialization (related rows, `in_bulk`, routings) is
+        run here, in the callers connection and transaction.
+        """
+        if self.values_serializer is None:
+            return [self._action(instance, self._document(instance)) for instance
+                in rows]
+        return [self._action(instance, document) for _, instance, document in
+            self.values_serializer.documents(rows)]
+
+    def encode_chunk(self, actions):
+        """ dumps the documents of `fetch_chunk` actions, the cpu bound part, which
+        needs no database
+        """
+        to_json = self.op_type != "update"
+        for action in actions:
+            if self.source_label in action:
+                action[self.source_label] = dump_document(
+                    action[self.source_label], to_json)
+        return self._to_owning_indices(actions)
+
+    def _to_owning_indices(self, actions):
+        """ sends the actions on documents already in a bucket of a `RollingIndex`
+        to that bucket instead of the write alias, with one search per chunk
+        """
+        if self.rolling_index is None or self.op_type == "create" or not actions:
+            return actions
+        owners = self.rolling_index.owning_indices(actions[0]["_type"],
+            [action["_id"] for action in actions])
+        for action in actions:
+            action["_index"] = owners.get(six.text_type(action["_id"]),
+                action["_index"])
+        return actions
+
+    def _document(self, instance):
+        if self.op_type == "delete":
+            return None
+        serializer = instance._search_meta.serializer_class(instance)
+        return serializer.document(fields=self.fields)
+
+    def _action(self, instance, body):
+        search_meta = instance._search_meta
         action = {
             "_op_type": self.op_type,
-            "_index": instance.es.index_name,
-            "_type": instance.es.doctype_name,
+            "_index": search_meta.write_index_name,
+            "_type": search_meta.doctype_name,
             "_id": instance.pk
         }
-        if self.op_type != "delete":
-            action.update({self.source_label: instance.es_serialized})
+        routing = search_meta.get_routing(instance)
+        if routing is not None:
+            action["_routing"] = routing
+        if self.op_type in ("index", "create"):
+            # elasticsearch can not externally version partial updates
+            version = search_meta.get_version(instance)
+            if version is not None:
+                action.update({"_version": version,
+                    "_version_type": search_meta.version_type})
+        if body is not None:
+            action[self.source_label] = body
         return action
 
 
-def queryset_chunker(queryset, chunksize=100):
-    ending_pk = queryset.aggregate(Min("pk"))["pk__min"] - 1
+def indexable_queryset(model):
+    """ the rows of `model` that belong in elasticsearch, the bulk counterpart of
+    the `is_elasticsearch_indexable` check on save
+    """
+    return model._default_manager.filter(is_elasticsearch_indexable=True)
+
+
+def queryset_chunker(queryset, chunksize=100, pks=None):
+    """ yields lists of at most `chunksize` instances of `queryset` ordered by pk.
+    when `pks` is given only those rows are loaded, `chunksize` pks at a time.
+    """
     queryset = queryset.order_by("pk")
+    if pks is not None:
+        pks = sorted(pks)
+        for i in range(0, len(pks), chunksize):
+            yield list(queryset.filter(pk__in=pks[i:i + chunksize]))
+        return
+
+    ending_pk = None
     while True:
-        print(ending_pk)
-        out = queryset.filter(pk__gt=ending_pk)[:chunksize]
-        yield out.iterator()
-        ending_pk = out.aggregate(Max("pk"))["pk__max"]
-        if ending_pk is None:
-            raise StopIteration
+        out = queryset if ending_pk is None else queryset.filter(pk__gt=ending_pk)
+        out = list(out[:chunksize])
+        if not out:
+            return
+        yield out
+        # `values()` querysets yield dicts
+        ending_pk = out[-1]["pk"] if isinstance(out[-1], dict) else out[-1].pk
 
 
-def send_chunks_to_es(chunker, elasticsearch=None, callback=None):
+def _clients(elasticsearch=None):
+    """ the bulk helpers take a client, a list of clients (to dual write), or None
+    for the default connection
+    """
+    if isinstance(elasticsearch, (list, tuple)):
+        return list(elasticsearch)
+    return [elasticsearch or get_connection()]
+
+
+def send_chunks_to_es(chunker, elasticsearch=None, callback=None, serializers=None,
+        senders=None):
     """ limits the cpu bound task of serializing high quantities of django models
-    by serializing small chunks and sending them to elasticsearch
+    by serializing small chunks and sending them to elasticsearch. with more than
+    one serializer or sender (`ES_BULK_SERIALIZERS` / `ES_BULK_SENDERS` by default)
+    the chunks go through a `BulkPipeline` instead.
     """
-    send_chunk = partial(es_bulk_op,
-        elasticsearch or connect(),
-        chunk_size=chunker.chunk_size)
+    if serializers is None:
+        serializers = getattr(settings, "ES_BULK_SERIALIZERS", 1)
+    if senders is None:
+        senders = getattr(settings, "ES_BULK_SENDERS", 1)
+    if serializers > 1 or senders > 1:
+        return BulkPipeline(chunker, elasticsearch, callback=callback,
+            serializers=serializers, senders=senders).run()
+
+    clients = _clients(elasticsearch)
+    send_chunk = partial(es_bulk_op, chunk_size=chunker.chunk_size)
 
     for chunk in chunker:
-        result = send_chunk(chunk)
+        if len(clients) > 1:
+            chunk = list(chunk)
+        results = [_send_chunk(send_chunk, client, chunk) for client in clients]
         if callable(callback):
-            callback(result)
+            callback(results[0])
+
+
+def _send_chunk(send_chunk, client, chunk):
+    """ sends a chunk of actions. a version conflict (409) on an externally
+    versioned action is a successful no-op, a newer document is already indexed.
+    any other conflict is an error. a partial update of a missing document (404)
+    is skipped, there is nothing to update until the row is indexed in full.
+    """
+    chunk = list(chunk)
+    versioned = set(six.text_type(action["_id"]) for action in chunk if
+        "_version_type" in action)
+    success, errors = send_chunk(client, chunk, raise_on_error=False)
+    errors = [error for error in errors if not _is_stale_write(error, versioned)]
+    if errors:
+        raise BulkIndexError("{0} document(s) failed to index.".format(len(errors)),
+            errors)
+    return success, errors
+
+
+def _is_stale_write(error, versioned):
+    op_type, item = list(error.items())[0]
+    if op_type == "update" and item.get("status") == 404:
+        return True
+    return item.get("status") == 409 and six.text_type(item.get("_id")) in versioned
+
+
+_DONE = object()
+
 
+class BulkPipeline(object):
+    """ overlaps the three stages of bulk indexing: the calling thread fetches the
+    chunks and builds their documents, running every query in its own connection
+    and transaction, a pool of `serializers` threads dumps them to json without
+    touching the database, and `senders` threads send them, so at most `senders`
+    bulk requests are in flight. the queues between the stages hold at most
+    `prefetch` chunks, a slow stage makes the others wait instead of filling the
+    memory. the first error stops the pipeline and is raised by `run`.
+    """
+    poll_interval = 0.1
+
+    def __init__(self, chunker, elasticsearch=None, callback=None, serializers=2,
+            senders=2, prefetch=None):
+        self.chunker = chunker
+        self.clients = _clients(elasticsearch)
+        self.callback = callback
+        self.serializers = max(serializers, 1)
+        self.senders = max(senders, 1)
+        prefetch = prefetch or self.senders
+        self.fetched = queue.Queue(maxsize=prefetch)
+        self.serialized = queue.Queue(maxsize=prefetch)
+        self._send_chunk = partial(es_bulk_op, chunk_size=chunker.chunk_size)
+        self._callback_lock = threading.Lock()
+        self._error = None
+
+    def run(self):
+        serializers = self._start(self._serialize, self.serializers)
+        senders = self._start(self._send, self.senders)
+        try:
+            for instances in self.chunker.querysets:
+                if instances and not self._put(self.fetched,
+                        self.chunker.fetch_chunk(instances)):
+                    break
+        except Exception:
+            self._fail()
+        self._finish(self.fetched, serializers)
+        self._finish(self.serialized, senders)
+        if self._error is not None:
+            six.reraise(*self._error)
+
+    def _start(self, target, count):
+        threads = [threading.Thread(target=target) for _ in range(count)]
+        for thread in threads:
+            thread.daemon = True
+            thread.start()
+        return threads
+
+    def _finish(self, stage_queue, threads):
+        for _ in threads:
+            self._put(stage_queue, _DONE)
+        for thread in threads:
+            thread.join()
+
+    def _fail(self):
+        if self._error is None:
+            self._error = sys.exc_info()
+
+    def _put(self, stage_queue, item):
+        """ waits for room in `stage_queue`, unless the pipeline failed
+        """
+        while self._error is None:
+            try:
+                stage_queue.put(item, timeout=self.poll_interval)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _get(self, stage_queue):
+        while self._error is None:
+            try:
+                return stage_queue.get(timeout=self.poll_interval)
+            except queue.Empty:
+                continue
+        return _DONE
+
+    def _serialize(self):
+        try:
+            while True:
+                actions = self._get(self.fetched)
+                if actions is _DONE:
+                    return
+                if not self._put(self.serialized,
+                        self.chunker.encode_chunk(actions)):
+                    return
+        except Exception:
+            self._fail()
+
+    def _send(self):
+        try:
+            while True:
+                actions = self._get(self.serialized)
+                if actions is _DONE:
+                    return
+                results = [_send_chunk(self._send_chunk, client, actions) for client
+                    in self.clients]
+                if callable(self.callback):
+                    with self._callback_lock:
+                        self.callback(results[0])
+        except Exception:
+            self._fail()
+
+
+def delete_documents(index_name, doctype_name, pks, elasticsearch=None,
+        chunk_size=500, delete_by_query=False, routings=None):
+    """ removes the documents of `pks` from elasticsearch, either with chunked
+    `_bulk` delete actions or, when `delete_by_query` is True, with one
+    `delete_by_query` per `chunk_size` ids. documents that are already missing are
+    not treated as errors.
 
+    :param routings: a dict of pk to routing for routed doctypes, which are always
+        deleted with `_bulk` actions.
+    """
+    clients = _clients(elasticsearch)
+    pks = list(pks)
+
+    if delete_by_query and not routings:
+        for i in range(0, len(pks), chunk_size):
+            for client in clients:
+                client.delete_by_query(index=index_name, doc_type=doctype_name,
+                    body={"query": {"ids": {"values": pks[i:i + chunk_size]}}})
+        return
+
+    routings = routings or {}
+
+    def action(pk):
+        action = {"_op_type": "delete", "_index": index_name, "_type": doctype_name,
+            "_id": pk}
+        if routings.get(pk) is not None:
+            action["_routing"] = routings[pk]
+        return action
+
+    errors = []
+    for client in clients:
+        _, client_errors = es_bulk_op(client, (action(pk) for pk in pks),
+            chunk_size=chunk_size, raise_on_error=False)
+        errors.extend(error for error in client_errors
+            if error["delete"].get("status") != 404)
+    if errors:
+        raise BulkIndexError("{0} document(s) failed to delete.".format(len(errors)),
+            errors)
+
+
+def remove_documents(model, pks, elasticsearch=None, chunk_size=500,
+        delete_by_query=False, routings=None):
+    """ `delete_documents` for the documents of `model`. the documents of a
+    `RollingIndex` are spread over its buckets, they are deleted by query through
+    the read alias, which spans them all.
+    """
+    search_meta = model._search_meta
+    if search_meta.rolling_index is not None:
+        return delete_documents(search_meta.index_name, search_meta.doctype_name,
+            pks, elasticsearch=elasticsearch, chunk_size=chunk_size,
+            delete_by_query=True)
+    return delete_documents(search_meta.write_index_name, search_meta.doctype_name,
+        pks, elasticsearch=elasticsearch, chunk_size=chunk_size,
+        delete_by_query=delete_by_query, routings=routings)
+
+
+def update_documents(model, pks, fields, elasticsearch=None, chunk_size=500):
+    """ re-syncs the rows of `pks` with partial `update` actions that only carry the
+    mapped `fields`.
+    """
+    chunker = ChunkSerializer(indexable_queryset(model), op_type="update",
+        fields=fields, pks=pks, chunk_size=chunk_size)
+    send_chunks_to_es(chunker, elasticsearch=elasticsearch)
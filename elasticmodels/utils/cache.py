@@ -0,0 +1,133 @@
+# utils/cache.py
+# author: andrew young
+# email: ayoung@thewulf.org
+
+import copy
+import threading
+from collections import OrderedDict
+
+from django.conf import settings
+
+
+VERSION_FIELD = "date_last_updated"
+
+
+class LRUCache(object):
+    """ a thread safe, in process, least recently used cache with the `get_many` /
+    `set_many` / `delete_many` interface of django's cache backends. copies of the
+    stored objects are returned, so callers can not alter each others instances.
+    """
+    def __init__(self, maxsize=1000):
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._data)
+
+    def get_many(self, keys):
+        found = {}
+        with self._lock:
+            for key in keys:
+                if key in self._data:
+                    value = self._data.pop(key)
+                    self._data[key] = value
+                    found[key] = copy.copy(value)
+        return found
+
+    def set_many(self, data, timeout=None):
+        with self._lock:
+            for key, value in data.items():
+                self._data.pop(key, None)
+                self._data[key] = value
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def delete_many(self, keys):
+        with self._lock:
+            for key in keys:
+                self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+class HydrationCache(object):
+    """ caches the model instances search hits are hydrated into, so popular hits do
+    not hit the database on every search. every entry remembers the
+    `date_last_updated` of the document it was loaded for and is only used while
+    the hits still carry that same value, saves and deletes evict it right away.
+
+    `ES_HYDRATION_CACHE` turns it on: "local" for an in process LRU of
+    `ES_HYDRATION_CACHE_SIZE` instances, or the name of a django cache.
+    """
+    key_prefix = "elasticmodels:hydration"
+
+    def __init__(self, backend=None):
+        self._backend = backend
+
+    @property
+    def enabled(self):
+        return bool(getattr(settings, "ES_HYDRATION_CACHE", None))
+
+    @property
+    def timeout(self):
+        return getattr(settings, "ES_HYDRATION_CACHE_TIMEOUT", 300)
+
+    @property
+    def backend(self):
+        if self._backend is None:
+            name = getattr(settings, "ES_HYDRATION_CACHE", None)
+            if name == "local":
+                self._backend = LRUCache(getattr(settings, "ES_HYDRATION_CACHE_SIZE",
+                    1000))
+            else:
+                from django.core.cache import caches
+                self._backend = caches[name]
+        return self._backend
+
+    def key(self, model, pk):
+        return "{0}:{1}.{2}:{3}".format(self.key_prefix, model._meta.app_label,
+            model._meta.object_name, pk)
+
+    def get_many(self, model, versions):
+        """ the cached instances of `versions`, a dict of pk -> hit version, that
+        are still current. returns a dict of pk -> instance.
+        """
+        keys = dict((self.key(model, pk), pk) for pk, version in versions.items() if
+            version is not None)
+        found = {}
+        for key, (version, instance) in self.backend.get_many(list(keys)).items():
+            pk = keys[key]
+            if version == versions[pk]:
+                # a local backend hands back the cached instance itself
+                found[pk] = copy.copy(instance)
+        return found
+
+    def set_many(self, model, instances, versions):
+        """ caches `instances`, a dict of pk -> instance, under their hit version
+        """
+        self.backend.set_many(dict((self.key(model, pk),
+            (versions[pk], copy.copy(instance))) for pk, instance in instances.items()
+            if versions.get(pk) is not None), self.timeout)
+
+    def invalidate(self, model, pks):
+        if self.enabled:
+            self.backend.delete_many([self.key(model, pk) for pk in pks])
+
+
+hydration_cache = HydrationCache()
+
+
+def lean_source():
+    """ the `_source` to request when hits only have to be hydrated: nothing, or
+    just the version field the hydration cache is keyed on.
+    """
+    return [VERSION_FIELD] if hydration_cache.enabled else False
+
+
+def hit_version(hit):
+    """ the `date_last_updated` a hit was indexed with, when it was requested
+    """
+    return (hit.get("_source") or {}).get(VERSION_FIELD)
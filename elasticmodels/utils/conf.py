@@ -3,8 +3,17 @@
 # email: ayoung@thewulf.org
 
 import functools
+import threading
+import time
+from datetime import datetime
+
+from django.utils import six, timezone
 
 from elasticmodels.utils import migration
+from elasticmodels.utils.aliasing import alias_cache
+from elasticmodels.utils.cache import lean_source
+from elasticmodels.utils.hydration import hit_pk, hit_versions, hydrate_groups
+from elasticmodels.utils.singleflight import coalesced
 
 
 class ESIndex(migration.SearchableModelMigrationManager):
@@ -21,12 +30,217 @@ class ESIndex(migration.SearchableModelMigrationManager):
         if not self.initialized:
             self.initialize()
 
+    @property
+    def doctypes(self):
+        """ maps each doctype name in this index to its model
+        """
+        return {model._search_meta.doctype_name: model for model in self.models}
+
     def initialize(self):
-        mappings = {m.es.doctype_name: m._search_meta.mapping for m in self.models}
+        mappings = {name: model._search_meta.mapping for name, model in
+            self.doctypes.items()}
         self._compose_next_index(mappings, self.settings)
-        assert self.indices.exists_alias(self.alias_name), "Something went wrong, "\
+        assert self.initialized, "Something went wrong, "\
             "the index could not be initialized"
+        self.put_search_templates()
+
+    def put_search_templates(self):
+        """ stores the search templates of every doctype in the cluster
+        """
+        for model in self.doctypes.values():
+            model.objects.put_search_templates()
 
     def update_settings(self, **kwargs):
         return self.indices.put_settings(index=self.name, body=self.settings, **kwargs)
 
+    def maybe_rollover(self):
+        """ a hook for indices that roll over, see `RollingIndex`
+        """
+        return None
+
+    def search_es(self, body=None, raw_only=False, **kwargs):
+        """ searches every doctype in the alias with a single request. unless
+        `raw_only` is True, `(objects, raw_results)` is returned where `objects` is
+        a list of instances of mixed models in the order of the hits. each model is
+        loaded with a single `in_bulk` query.
+
+        :param ids_only: see `ElasticModelManager.search_es`
+        """
+        doctypes = self.doctypes
+        index = kwargs.pop("index", self.alias_name)
+        ids_only = kwargs.pop("ids_only", not raw_only)
+        if ids_only:
+            kwargs.setdefault("_source", lean_source())
+
+        raw_results = coalesced(self.read_elasticsearch.search, self.read_using,
+            index=index, doc_type=",".join(sorted(doctypes)), body=body, **kwargs)
+
+        if raw_only:
+            return raw_results
+
+        hits, versions = [], {}
+        for hit in raw_results["hits"]["hits"]:
+            model = doctypes.get(hit["_type"])
+            if model is not None:
+                hits.append((model, hit_pk(model, hit)))
+                versions.setdefault(model, {}).update(hit_versions(model, [hit]))
+        return hydrate_groups([hits], versions)[0], raw_results
+
+
+class RollingIndex(ESIndex):
+    """ an index for append-only models made of a series of physical indices,
+    `<name>-000001`, `<name>-000002`... writes go through the `<name>-write` alias,
+    which only points at the newest index, while the `<name>` alias spans all of
+    them for searching. the write index is rolled over to a new one as soon as any
+    of `rollover_conditions` is met (see the elasticsearch rollover api), so the
+    indices are bucketed by time (`max_age`) or size (`max_docs`, `max_size`).
+    >>> class EventIndex(RollingIndex):
+    ...     name = "events"
+    ...     rollover_conditions = {"max_age": "1d", "max_docs": 10000000}
+
+    rollovers are checked at most every `rollover_check_interval` seconds as
+    documents get written, or explicitly with `rollover()`.
+    """
+    rollover_conditions = {"max_age": "7d"}
+    rollover_check_interval = 300
+    # how long the creation dates of the buckets are trusted, in seconds
+    buckets_ttl = 300
+
+    def __init__(self, *args, **kwargs):
+        self._last_rollover_check = 0
+        self._buckets = None
+        self._buckets_expire = 0
+        self._rollover_lock = threading.Lock()
+        super(RollingIndex, self).__init__(*args, **kwargs)
+
+    @property
+    def write_alias(self):
+        return "{0}-write".format(self.alias_name)
+
+    def _get_current_index_name(self):
+        # the read alias spans every bucket, only the write index takes documents
+        indices = alias_cache.get_indices(self.elasticsearch, self.write_alias)
+        if not indices:
+            return "{0}-000001".format(self.alias_name)
+        return indices[0]
+
+    def owning_indices(self, doctype_name, pks):
+        """ the bucket holding the document of each of `pks`, a dict of pk (as text)
+        -> index name, documents that are not indexed (or not refreshed yet) are
+        left out. documents stay in the bucket they were first written to, updates
+        and deletes have to go there rather than to the write alias.
+        """
+        pks = [six.text_type(pk) for pk in pks]
+        if not pks:
+            return {}
+        # the write connection, reads may lag behind it
+        result = self.elasticsearch.search(index=self.alias_name,
+            doc_type=doctype_name, body={"query": {"ids": {"values": pks}},
+                "_source": False, "size": len(pks)})
+        return dict((hit["_id"], hit["_index"]) for hit in result["hits"]["hits"])
+
+    def _mappings(self):
+        return {name: model._search_meta.mapping for name, model in
+            self.doctypes.items()}
+
+    def initialize(self):
+        first_index = "{0}-000001".format(self.alias_name)
+        self.indices.create(index=first_index, body={
+            "settings": self.settings,
+            "mappings": self._mappings(),
+            "aliases": {self.alias_name: {}, self.write_alias: {}}})
+        alias_cache.invalidate(self.alias_name)
+        alias_cache.invalidate(self.write_alias)
+        assert self.initialized, "Something went wrong, "\
+            "the index could not be initialized"
+        self.put_search_templates()
+
+    def rollover(self, conditions=None, dry_run=False):
+        """ rolls the write alias over to a new index when any of `conditions`
+        (defaults to `rollover_conditions`) is met, empty conditions always roll
+        over. the new index is created with the current mappings and joins the
+        read alias.
+        """
+        body = {
+            "conditions": self.rollover_conditions if conditions is None else
+                conditions,
+            "settings": self.settings,
+            "mappings": self._mappings(),
+            "aliases": {self.alias_name: {}},
+        }
+        result = self.indices.rollover(alias=self.write_alias, body=body,
+            dry_run=dry_run)
+        if result.get("rolled_over"):
+            self._buckets = None
+            alias_cache.invalidate(self.alias_name)
+            alias_cache.invalidate(self.write_alias)
+        return result
+
+    def maybe_rollover(self):
+        now = time.time()
+        if now - self._last_rollover_check < self.rollover_check_interval:
+            return None
+        with self._rollover_lock:
+            if now - self._last_rollover_check < self.rollover_check_interval:
+                return None
+            self._last_rollover_check = now
+            return self.rollover()
+
+    def _run_migration(self, mappings, settings, role_back=None):
+        # the physical indices are never reindexed, a mapping that can not be
+        # merged takes effect with a new bucket
+        return self.rollover(conditions={})
+
+    @property
+    def buckets(self):
+        """ `(index_name, start, end)` for every physical index, oldest first.
+        `start` is the creation date of the index, `end` the creation date of the
+        next one, the first bucket starts and the newest ends open (None).
+        """
+        if self._buckets is None or time.time() > self._buckets_expire:
+            created = self.indices.get_settings(index=self.alias_name,
+                name="index.creation_date", flat_settings=True)
+            dates = sorted((int(info["settings"]["index.creation_date"]), name)
+                for name, info in created.items())
+            buckets = []
+            for i, (date, name) in enumerate(dates):
+                start = None if i == 0 else self._to_datetime(date)
+                end = self._to_datetime(dates[i + 1][0]) if i + 1 < len(dates) \
+                    else None
+                buckets.append((name, start, end))
+            self._buckets = buckets
+            self._buckets_expire = time.time() + self.buckets_ttl
+        return self._buckets
+
+    @staticmethod
+    def _to_datetime(milliseconds):
+        return datetime.fromtimestamp(milliseconds / 1000.0, tz=timezone.utc)
+
+    def indices_for_range(self, start=None, end=None):
+        """ the physical indices that can hold documents written between `start`
+        and `end` (aware datetimes, either may be None for an open range). this
+        assumes documents are written close to the time they describe, which holds
+        for append-only models.
+        """
+        names = []
+        for name, bucket_start, bucket_end in self.buckets:
+            if start is not None and bucket_end is not None and bucket_end <= start:
+                continue
+            if end is not None and bucket_start is not None and bucket_start > end:
+                continue
+            names.append(name)
+        return names
+
+    def search_es(self, body=None, raw_only=False, start=None, end=None, **kwargs):
+        """ `ESIndex.search_es` limited to the buckets overlapping `start` and `end`
+        when either is given. combine it with a range filter in `body` on the
+        models date field, the buckets are only a coarse cut.
+        """
+        if start is not None or end is not None:
+            indices = self.indices_for_range(start, end)
+            if not indices:
+                raw_results = {"hits": {"total": 0, "hits": []}}
+                return raw_results if raw_only else ([], raw_results)
+            kwargs["index"] = ",".join(indices)
+        return super(RollingIndex, self).search_es(body=body, raw_only=raw_only,
+            **kwargs)
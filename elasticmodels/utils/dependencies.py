@@ -0,0 +1,323 @@
+# utils/dependencies.py
+# author: andrew young
+# email: ayoung@thewulf.org
+
+import threading
+import time
+from collections import defaultdict
+
+from django.apps import apps
+from django.conf import settings
+from django.core.exceptions import FieldDoesNotExist
+from django.db import connection
+
+from elasticmodels.utils import outbox, sync
+
+
+def _related_model(field):
+    related = getattr(field, "related_model", None)
+    return related if related is not None else field.rel.to
+
+
+class Dependency(object):
+    """ an edge in the reindexing graph: documents of `model` embed data reached
+    through the `path` lookup (ie "author" or "tags" or "author__publisher"), so they
+    need reindexing whenever one of `fields` changes on the related model, or the
+    many to many links along the path change. when no fields are given any save of
+    the related model counts.
+    declared on a searchable model as:
+    >>> class MappingMeta:
+    ...     dependencies = {"author": ["name"], "tags": None}
+    """
+    def __init__(self, model, path, fields=None):
+        self.model = model
+        self.path = path
+        self.fields = set(fields or [])
+        self._hops = None
+        self._related_model = None
+
+    def __repr__(self):
+        return "{0}({1}.{2})".format(self.__class__.__name__, self.model.__name__,
+            self.path)
+
+    @property
+    def hops(self):
+        """ the (model, name, field) of every step of the path
+        """
+        if self._hops is None:
+            hops, model = [], self.model
+            for name in self.path.split("__"):
+                field = model._meta.get_field(name)
+                hops.append((model, name, field))
+                model = _related_model(field)
+            self._hops, self._related_model = hops, model
+        return self._hops
+
+    @property
+    def related_model(self):
+        if self._related_model is None:
+            self.hops
+        return self._related_model
+
+    def m2m_hops(self):
+        """ yields `(position, through, field, forward)` for every many to many step
+        of the path, `field` being the many to many field and `forward` whether the
+        step follows it from the model declaring it
+        """
+        for position, (model, name, field) in enumerate(self.hops):
+            if getattr(field, "many_to_many", False):
+                forward = not field.auto_created
+                m2m_field = field if forward else field.field
+                yield position, m2m_field.rel.through, m2m_field, forward
+
+    def watches(self, update_fields=None, changed=None):
+        """ whether a save with `update_fields` that changed the `changed` fields
+        (None when unknown) can change the embedded data
+        """
+        if not self.fields:
+            return True
+        fields = self.fields
+        if update_fields is not None:
+            fields = fields.intersection(update_fields)
+        if changed is not None:
+            fields = fields.intersection(changed)
+        return bool(fields)
+
+    def parent_pks(self, position, pks):
+        """ the pks of the documents reaching any of the `pks` rows at the
+        `position`th step of the path, in one query
+        """
+        if position == 0:
+            return set(pks)
+        lookup = {"{0}__in".format("__".join(self.path.split("__")[:position])):
+            list(pks)}
+        return set(self.model._default_manager.filter(**lookup)
+            .values_list("pk", flat=True).distinct())
+
+    def affected_pks(self, related_pks):
+        """ the pks of the documents embedding any of `related_pks`, in one query
+        """
+        return self.parent_pks(len(self.hops), related_pks)
+
+
+def _m2m_pks(field, instance, reverse, pk_set, forward):
+    """ the pks of the rows whose links changed on the `forward` (declaring) side of
+    the many to many `field` or on the other one. `pk_set` is None while clearing,
+    the links are then read from the through table before they disappear.
+    """
+    if forward != reverse:
+        return set([instance.pk])
+    if pk_set is not None:
+        return set(pk_set)
+    through = field.rel.through
+    if reverse:
+        lookup, column = field.m2m_reverse_field_name(), field.m2m_field_name()
+    else:
+        lookup, column = field.m2m_field_name(), field.m2m_reverse_field_name()
+    return set(through._default_manager.filter(**{lookup: instance.pk})
+        .values_list(column, flat=True))
+
+
+class DependencyTracker(object):
+    """ collects changes of related rows and reindexes the documents depending on
+    them in bulk. changes are gathered per thread until the transaction commits,
+    deduplicated, and then flushed either right away or, when
+    `ES_DEPENDENCY_DEBOUNCE` is greater than 0, once that many seconds have passed
+    without another commit adding to the batch, and at the latest
+    `ES_DEPENDENCY_MAX_WAIT` seconds after the first one. with `ES_OUTBOX` the
+    documents are queued in the outbox instead.
+
+    the watched fields of related rows are remembered as they are loaded, so a
+    save only counts when one of them actually changed.
+    """
+    snapshot_attr = "_es_dependency_snapshot"
+
+    def __init__(self):
+        self._graph = None
+        self._m2m_graph = None
+        self._watched = {}
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._pending = defaultdict(set)
+        self._timer = None
+        self._first_pending = None
+
+    @property
+    def debounce(self):
+        return getattr(settings, "ES_DEPENDENCY_DEBOUNCE", 0)
+
+    @property
+    def max_wait(self):
+        max_wait = getattr(settings, "ES_DEPENDENCY_MAX_WAIT", None)
+        return self.debounce * 10 if max_wait is None else max_wait
+
+    @property
+    def graph(self):
+        """ maps each related model to the dependencies pointing at it
+        """
+        if self._graph is None:
+            from elasticmodels.models import SearchableModel
+
+            graph, m2m_graph = defaultdict(list), defaultdict(list)
+            for model in apps.get_models():
+                if issubclass(model, SearchableModel):
+                    for dependency in model._search_meta.dependencies:
+                        graph[dependency.related_model].append(dependency)
+                        for hop in dependency.m2m_hops():
+                            m2m_graph[hop[1]].append((dependency,) + hop)
+            self._graph, self._m2m_graph = graph, m2m_graph
+        return self._graph
+
+    @property
+    def m2m_graph(self):
+        """ maps each many to many through model to the
+        `(dependency, position, through, field, forward)` steps crossing it
+        """
+        self.graph
+        return self._m2m_graph
+
+    def watched(self, model):
+        """ the attname of every field of `model` a dependency watches, None for the
+        names that are not concrete fields
+        """
+        if model not in self._watched:
+            watched = {}
+            for dependency in self.graph.get(model, []):
+                for name in dependency.fields:
+                    try:
+                        watched[name] = model._meta.get_field(name).attname
+                    except (FieldDoesNotExist, AttributeError):
+                        watched[name] = None
+            self._watched[model] = watched
+        return self._watched[model]
+
+    def _local_state(self):
+        if not hasattr(self._local, "related"):
+            # dependency -> related pks saved or deleted, model -> parent pks
+            self._local.related = defaultdict(set)
+            self._local.parents = defaultdict(set)
+        return self._local.related, self._local.parents
+
+    def _snapshot(self, model, instance):
+        values = instance.__dict__
+        setattr(instance, self.snapshot_attr, dict((name, values[attname]) for
+            name, attname in self.watched(model).items() if attname in values))
+
+    def _changed(self, model, instance):
+        """ the watched fields of `instance` that differ from their loaded values,
+        None when nothing was loaded
+        """
+        snapshot = getattr(instance, self.snapshot_attr, None)
+        if snapshot is None:
+            return None
+        values = instance.__dict__
+        # deferred fields that were never assigned did not change
+        return set(name for name, attname in self.watched(model).items() if
+            attname is None or (attname in values and
+                (name not in snapshot or values[attname] != snapshot[name])))
+
+    def related_loaded(self, sender, instance):
+        if not apps.ready:
+            return
+        model = sender._meta.concrete_model
+        if self.graph.get(model):
+            self._snapshot(model, instance)
+
+    def related_saved(self, sender, instance, created=False, update_fields=None,
+            using=None):
+        model = sender._meta.concrete_model
+        dependencies = self.graph.get(model, [])
+        if not dependencies:
+            return
+        changed = None if created else self._changed(model, instance)
+        self._snapshot(model, instance)
+        for dependency in dependencies:
+            if dependency.watches(update_fields, changed):
+                self._local_state()[0][dependency].add(instance.pk)
+                sync.on_commit(self._committed, using=using)
+
+    def related_deleted(self, sender, instance, using=None):
+        # gathered with the saves, so a bulk or cascading delete costs one query per
+        # edge on commit rather than one per row. parents deleted along with the
+        # row need no reindexing
+        for dependency in self.graph.get(sender._meta.concrete_model, []):
+            self._local_state()[0][dependency].add(instance.pk)
+            sync.on_commit(self._committed, using=using)
+
+    def related_m2m_changed(self, sender, instance, action, reverse, pk_set,
+            using=None):
+        # the links are gathered before a clear removes them, and after they were
+        # added or removed
+        if action not in ("post_add", "post_remove", "pre_clear"):
+            return
+        for dependency, position, through, field, forward in \
+                self.m2m_graph.get(sender, []):
+            pks = _m2m_pks(field, instance, reverse, pk_set, forward)
+            pks = dependency.parent_pks(position, pks) if pks else pks
+            if pks:
+                self._local_state()[1][dependency.model].update(pks)
+                sync.on_commit(self._committed, using=using)
+
+    def _committed(self):
+        # the first callback of a transaction drains the state, the rest are no-ops.
+        # state left over by a rolled back transaction is simply reindexed with the
+        # next commit
+        related, parents = self._local_state()
+        if not related and not parents:
+            return
+        del self._local.related, self._local.parents
+
+        # one query per edge for everything saved or deleted in the transaction
+        for dependency, related_pks in related.items():
+            parents[dependency.model].update(dependency.affected_pks(related_pks))
+
+        with self._lock:
+            for model, pks in parents.items():
+                self._pending[model].update(pks)
+            if self.debounce > 0:
+                now = time.time()
+                if self._first_pending is None:
+                    self._first_pending = now
+                # steady commits push the flush back, but never past the max wait
+                delay = min(self.debounce, self._first_pending + self.max_wait - now)
+                if delay > 0:
+                    if self._timer is not None:
+                        self._timer.cancel()
+                    self._timer = threading.Timer(delay, self._flush_in_thread)
+                    self._timer.daemon = True
+                    self._timer.start()
+                    return
+        self.flush()
+
+    def _flush_in_thread(self):
+        try:
+            self.flush()
+        finally:
+            connection.close()
+
+    def flush(self):
+        """ reindexes every pending document, one bulk run per model, or queues
+        them in the outbox
+        """
+        from elasticmodels.utils.bulk import (ChunkSerializer, send_chunks_to_es,
+            indexable_queryset)
+
+        with self._lock:
+            pending, self._pending = self._pending, defaultdict(set)
+            if self._timer is not None:
+                self._timer.cancel()
+            self._timer = self._first_pending = None
+
+        for model, pks in pending.items():
+            if not pks:
+                continue
+            if outbox.outbox_enabled():
+                outbox.enqueue_many(model, pks, outbox.INDEX)
+                continue
+            manager = model.objects
+            chunker = ChunkSerializer(indexable_queryset(model), op_type="index",
+                pks=pks, chunk_size=manager._chunk_size)
+            send_chunks_to_es(chunker, elasticsearch=manager.write_connections)
+
+
+tracker = DependencyTracker()
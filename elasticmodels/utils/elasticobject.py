@@ -7,15 +7,33 @@ from functools import partial
 from django.conf import settings
 
 from elasticsearch import Elasticsearch
-from elasticsearch.exceptions import NotFoundError
+from elasticsearch.exceptions import ConflictError, NotFoundError
+
+
+# client methods that only read, they are proxied to the read connection
+READ_METHODS = frozenset(["search", "count", "msearch", "get", "mget", "exists",
+    "explain", "get_source", "search_template", "msearch_template", "suggest",
+    "termvectors", "mtermvectors", "field_caps", "scroll"])
+
+# attributes __getattr__ never proxies, resolving the client depends on them
+UNPROXIED = frozenset(["model", "_elastic", "read_using", "write_using",
+    "dual_write_using"])
 
 
 class ElasticObject(object):
     """a simple object that has a gettable/settable elasticsearch attribute
     the __getattr__ magic method also acts as a proxy to the elasticsearch object.
+
+    `read_using`, `write_using` and `dual_write_using` name `ES_CONNECTIONS`
+    entries: reads go to the read connection, everything else to the write
+    connection, and writes are repeated on the dual write connection when one is
+    set, ie while migrating to another cluster.
     """
     _elastic = None
     _chunk_size = getattr(settings, "ELASTIC_CHUNK_SIZE", 500)
+    read_using = None
+    write_using = None
+    dual_write_using = None
 
     @property
     def indices(self):
@@ -26,16 +44,23 @@ class ElasticObject(object):
     def __getattr__(self, key):
         """proxy Elasticsearch class as much as possible
         """
-        object_ = self.elasticsearch.__getattribute__(key)
+        # never proxy the attributes python and django probe for (ie `copy`
+        # looking up `__setstate__` on a manager before it has a model) or the
+        # ones the client lookup needs, it would come back here for them
+        if key.startswith("__") or key in UNPROXIED:
+            raise AttributeError(key)
+        client = self.read_elasticsearch if key in READ_METHODS else \
+            self.elasticsearch
+        object_ = client.__getattribute__(key)
         if callable(object_):
             object_ = partial(object_, index=self.index_name,
                 doc_type=self.doctype_name)
         return object_
 
     def _get_es(self):
-        from elasticmodels import connect
+        from elasticmodels import get_connection
         if not self._elastic:
-            self._elastic = connect()
+            self._elastic = get_connection(self.write_using)
         return self._elastic
 
     def _set_es(self, es_obj):
@@ -45,42 +70,84 @@ class ElasticObject(object):
 
     elasticsearch = property(_get_es, _set_es)
 
+    @property
+    def read_elasticsearch(self):
+        from elasticmodels import get_connection
+        if self.read_using == self.write_using:
+            # keeps honoring a client that was set explicitly
+            return self.elasticsearch
+        return get_connection(self.read_using)
+
+    @property
+    def dual_elasticsearch(self):
+        from elasticmodels import get_connection
+        if self.dual_write_using is None:
+            return None
+        return get_connection(self.dual_write_using)
+
+    @property
+    def write_connections(self):
+        """ every client a write has to reach, for the bulk helpers
+        """
+        dual = self.dual_elasticsearch
+        return [self.elasticsearch] if dual is None else [self.elasticsearch, dual]
+
 
 class ElasticDoctype(ElasticObject):
-    def __init__(self, index_name, doctype_name, pk):
+    def __init__(self, index_name, doctype_name, pk, routing=None, read_using=None,
+            write_using=None, dual_write_using=None):
         self.index_name = index_name
         self.doctype_name = doctype_name
         self.pk = pk
+        self.routing = routing
+        self.read_using = read_using
+        self.write_using = write_using
+        self.dual_write_using = dual_write_using
         for field in [index_name, doctype_name, pk]:
             assert field is not None
 
-    def __getattr__(self, key):
-        """proxy Elasticsearch class as much as possible
+    def _params(self, kwargs):
+        """ adds the documents routing to the request parameters
         """
-        object_ = self.elasticsearch.__getattribute__(key)
-        if callable(object_):
-            object_ = partial(object_, index=self.index_name,
-                doc_type=self.doctype_name)
-        return object_
+        if self.routing is not None:
+            kwargs.setdefault("routing", self.routing)
+        return kwargs
+
+    def _write(self, method, ignore_missing=False, **kwargs):
+        """ runs a write on the write connection, and repeats it on the dual write
+        connection. the result of the primary write is returned. a version conflict
+        on an externally versioned write means a newer document is already indexed,
+        so it is a successful no-op and None is returned for it.
+        """
+        results = []
+        for client in self.write_connections:
+            try:
+                results.append(getattr(client, method)(index=self.index_name,
+                    doc_type=self.doctype_name, **kwargs))
+            except NotFoundError:
+                if not ignore_missing:
+                    raise
+                results.append(None)
+            except ConflictError:
+                if "version_type" not in kwargs:
+                    raise
+                results.append(None)
+        return results[0]
 
     def get_document(self, **kwargs):
-        return self.get(id=self.pk, **kwargs)
+        return self.get(id=self.pk, **self._params(kwargs))
 
     def update_document(self, body, **kwargs):
-        return self.index(id=self.pk, body=body, **kwargs)
+        return self._write("index", id=self.pk, body=body, **self._params(kwargs))
 
     def create_document(self, body, **kwargs):
-        return self.create(id=self.pk, body=body, **kwargs)
+        return self._write("create", id=self.pk, body=body, **self._params(kwargs))
 
     def remove_document(self, **kwargs):
-        try:
-            self.delete(id=self.pk, **kwargs)
-        except NotFoundError:
-            pass
+        self._write("delete", ignore_missing=True, id=self.pk, **self._params(kwargs))
 
     def document_exists(self):
-        return self.exists(id=self.pk)
+        return self.exists(id=self.pk, **self._params({}))
 
     def explain_query(self, body, **kwargs):
-        return self.explain(id=self.pk, body=body, **kwargs)
-
+        return self.explain(id=self.pk, body=body, **self._params(kwargs))
@@ -16,10 +16,44 @@ try:
 except ImportError:
     from django.forms.util import ValidationError
 
-from .serializers import JSONEncoder
+from .serializers import JSONEncoder, LazyJSON
 
-def make_contrib(cls, default=None):
-    return default if default else lambda key, val: setattr(cls, key, val)
+
+class JSONDescriptor(object):
+    """ keeps the json loaded from the database as a `LazyJSON`, decodes it on first
+    access and keeps the decoded value on the instance from then on. the wrapper
+    never leaves the instance, `values()` and `values_list()` read the raw json.
+    """
+    def __init__(self, field):
+        self.field = field
+
+    def __get__(self, obj, type=None):
+        if obj is None:
+            return self
+        attname = self.field.attname
+        if attname not in obj.__dict__:
+            # deferred field, load it the way django's DeferredAttribute would
+            obj.refresh_from_db(fields=[attname])
+        value = obj.__dict__[attname]
+        if isinstance(value, LazyJSON):
+            value = obj.__dict__[attname] = self.field.decode(value)
+        return value
+
+    def __set__(self, obj, value):
+        obj.__dict__[self.field.attname] = self.field.pre_init(value, obj)
+
+
+def make_contrib(superclass, func=None):
+    """ returns a `contribute_to_class` method that runs `func` (or the one of the
+    superclass) and then attaches a `JSONDescriptor` for the field to the model.
+    """
+    def contribute_to_class(self, cls, name, *args, **kwargs):
+        if func:
+            func(self, cls, name, *args, **kwargs)
+        else:
+            super(superclass, self).contribute_to_class(cls, name, *args, **kwargs)
+        setattr(cls, self.name, JSONDescriptor(self))
+    return contribute_to_class
 
 
 class SubfieldBase(type):
@@ -44,23 +78,31 @@ class JSONFieldBase(six.with_metaclass(SubfieldBase, models.Field)):
         super(JSONFieldBase, self).__init__(*args, **kwargs)
 
     def pre_init(self, value, obj):
-        """Convert a string value to JSON only if it needs to be deserialized.
-        SubfieldBase metaclass has been modified to call this method instead of
-        to_python so that we can check the obj state and determine if it needs to be
-        deserialized
+        """Wrap a string value loaded from the database in a `LazyJSON`, it is only
+        deserialized once the attribute is read (see `JSONDescriptor`), so rows whose
+        json is never looked at never pay for `json.loads`. called by the descriptor
+        for every value set on the instance.
         """
         try:
             if obj._state.adding:
                 if getattr(obj, "pk", None) is not None:
                     if isinstance(value, six.string_types):
-                        try:
-                            return json.loads(value, **self.load_kwargs)
-                        except ValueError:
-                            raise ValidationError(_("Enter valid JSON"))
+                        return LazyJSON(value, self.load_kwargs)
         except AttributeError:
             pass
         return value
 
+    def decode(self, value):
+        try:
+            return value.decode()
+        except ValueError:
+            raise ValidationError(_("Enter valid JSON"))
+
+    def pre_save(self, model_instance, add):
+        # read past the descriptor so an untouched value is not decoded just to
+        # be encoded again
+        return model_instance.__dict__.get(self.attname)
+
     def to_python(self, value):
         """The SubfieldBase metaclass calls pre_init instead of to_python, however
         to_python is still necessary for Django's deserializer
@@ -72,6 +114,8 @@ class JSONFieldBase(six.with_metaclass(SubfieldBase, models.Field)):
         """
         if self.null and value is None:
             return None
+        if isinstance(value, LazyJSON):
+            return value.raw
         return json.dumps(value, **self.dump_kwargs)
 
     def value_to_string(self, obj):
@@ -79,11 +123,19 @@ class JSONFieldBase(six.with_metaclass(SubfieldBase, models.Field)):
         return self.get_db_prep_value(value, None)
 
     def value_from_object(self, obj):
+        value = obj.__dict__.get(self.attname)
+        if isinstance(value, LazyJSON):
+            if value.display is None:
+                value.display = self.lazy_for_display(value)
+            return value.display
         value = super(JSONFieldBase, self).value_from_object(obj)
         if self.null and value is None:
             return None
         return self.dumps_for_display(value)
 
+    def lazy_for_display(self, value):
+        return value.raw
+
     def dumps_for_display(self, value):
         return json.dumps(value, **self.dump_kwargs)
 
@@ -111,6 +163,9 @@ class JSONField(JSONFieldBase, models.TextField):
         kwargs.update(self.dump_kwargs)
         return json.dumps(value, **kwargs)
 
+    def lazy_for_display(self, value):
+        return self.dumps_for_display(self.decode(value))
+
 
 class JSONCharField(JSONFieldBase, models.CharField):
     """JSONCharField is a generic textfield that serializes/deserializes JSON objects,
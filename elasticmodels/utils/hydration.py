@@ -0,0 +1,75 @@
+# utils/hydration.py
+# author: andrew young
+# email: ayoung@thewulf.org
+
+from collections import OrderedDict
+
+from elasticmodels.utils.cache import hydration_cache, hit_version
+
+
+def hit_pk(model, hit):
+    """ the pk of the model instance a search hit refers to. documents are indexed
+    under the instance pk, so `_id` is always enough.
+    """
+    return model._meta.pk.to_python(hit["_id"])
+
+
+def hit_versions(model, hits):
+    """ a dict of pk -> `date_last_updated` for hits requested with it, which the
+    hydration cache needs. empty when the cache is off.
+    """
+    if not hydration_cache.enabled:
+        return {}
+    return dict((hit_pk(model, hit), hit_version(hit)) for hit in hits)
+
+
+def load_instances(model, pks, versions=None):
+    """ a dict of pk -> instance for `pks`. with `versions` (see `hit_versions`)
+    current instances come from the hydration cache and only the misses are loaded,
+    with a single query, and cached.
+    """
+    pks = set(pks)
+    if not versions:
+        return model._default_manager.in_bulk(list(pks))
+
+    cached = hydration_cache.get_many(model, dict((pk, versions.get(pk)) for pk in
+        pks))
+    missing = pks.difference(cached)
+    if missing:
+        loaded = model._default_manager.in_bulk(list(missing))
+        hydration_cache.set_many(model, loaded, versions)
+        cached.update(loaded)
+    return cached
+
+
+def hydrate_pks(model, pks, versions=None):
+    """ loads `pks` with a single query and returns the instances in the same order
+    as `pks`. pks that no longer exist in the database are skipped.
+    """
+    if not pks:
+        return []
+    instances = load_instances(model, pks, versions)
+    return [instances[pk] for pk in pks if pk in instances]
+
+
+def hydrate_groups(groups, versions=None):
+    """ hydrates several ordered lists of `(model, pk)` pairs at once, running only a
+    single query per model no matter how many groups reference it.
+
+    :param groups: an iterable of lists of `(model, pk)` tuples
+    :param versions: a dict of model -> `hit_versions`, for the hydration cache
+    :rtype: a list of instance lists, one per group, each in its original order
+    """
+    groups = list(groups)
+    versions = versions or {}
+    wanted = OrderedDict()
+    for group in groups:
+        for model, pk in group:
+            wanted.setdefault(model, set()).add(pk)
+
+    loaded = {}
+    for model, pks in wanted.items():
+        loaded[model] = load_instances(model, pks, versions.get(model))
+
+    return [[loaded[model][pk] for model, pk in group if pk in loaded[model]]
+        for group in groups]
@@ -4,6 +4,8 @@
 
 from __future__ import absolute_import, unicode_literals
 
+from django.utils import six
+
 
 FIELD_MAP = {
     "AutoField": "long",
@@ -39,6 +41,10 @@ FIELD_MAP = {
     "FieldFile": "string",
     "FilePathField": "string",
 
+    # stored as json text, indexed as the decoded object
+    "JSONField": "object",
+    "JSONCharField": "object",
+
     "ForeignKey": "object",
     "OneToOneField": "object",
     "ManyToManyField": "object"
@@ -88,3 +94,35 @@ class SearchField(object):
         mapping.update(self.options)
         return mapping
 
+
+
+class SuggestField(SearchField):
+    """ a `completion` field for the completion suggester, fed from the `source`
+    attribute (or callable taking the instance) of the model. hits of
+    `ElasticModelManager.suggest` carry the `payload` fields of the document.
+    declared on a searchable model as:
+    >>> class MappingMeta:
+    ...     suggest_fields = {"title_suggest": {"source": "title",
+    ...         "payload": ["title", "slug"], "analyzer": "simple"}}
+    """
+    def __init__(self, name, source, payload=None, **options):
+        super(SuggestField, self).__init__(name, "completion", **options)
+        self.source = source
+        self.payload = list(payload or [])
+
+    def get_map(self):
+        return "completion"
+
+    def inputs(self, value):
+        """ the completion document of a source `value`, a string or a list of them
+        """
+        if isinstance(value, (list, tuple)):
+            inputs = [six.text_type(item) for item in value if item]
+        else:
+            inputs = [six.text_type(value)] if value else []
+        return {"input": inputs} if inputs else None
+
+    def serialize(self, instance):
+        source = self.source
+        value = source(instance) if callable(source) else getattr(instance, source)
+        return self.inputs(value)
@@ -3,17 +3,27 @@
 # email: ayoung@thewulf.org
 
 import threading
+from contextlib import contextmanager
 
 from django.conf import settings
 
 from elasticsearch import helpers
 
+from elasticmodels.utils.aliasing import alias_cache, revision_number
 from elasticmodels.utils.elasticobject import ElasticObject
 
 
 class MigrationError(Exception): pass
 
 
+# index settings applied to the target index for the duration of a bulk load
+BULK_LOAD_SETTINGS = {
+    "refresh_interval": "-1",
+    "number_of_replicas": 0,
+    "translog.durability": "async",
+}
+
+
 class SearchableModelMigrationManager(ElasticObject):
     """ aka the best thing for es and django dev ever
     """
@@ -23,13 +33,23 @@ class SearchableModelMigrationManager(ElasticObject):
             raise AttributeError("No alias name provided.")
 
     def _get_current_index_name(self):
-        """ grabs the name of the currently alaised index
+        """ grabs the name of the currently alaised index, served from the alias
+        cache. only a missing alias means revision 0, other errors propagate.
         """
-        try:
-            alias = self.indices.get_alias(name=self.alias_name)
-            return list(alias.keys())[0]
-        except:
+        indices = alias_cache.get_indices(self.elasticsearch, self.alias_name)
+        if not indices:
             return "{alias}_0".format(alias=self.alias_name)
+        return max(indices, key=revision_number)
+
+    def _put_alias(self, index, alias=None):
+        alias = alias or self.alias_name
+        self.indices.put_alias(index=index, name=alias)
+        alias_cache.invalidate(alias)
+
+    def _delete_alias(self, index, alias=None):
+        alias = alias or self.alias_name
+        self.indices.delete_alias(index=index, name=alias)
+        alias_cache.invalidate(alias)
 
     def get_settings(self):
         return self.indices.\
@@ -43,7 +63,7 @@ class SearchableModelMigrationManager(ElasticObject):
     def initialized(self):
         """ lets us know if the alias scheme has been initialized
         """
-        return self.indices.exists_alias(name=self.alias_name)
+        return bool(alias_cache.get_indices(self.elasticsearch, self.alias_name))
 
     @property
     def models(self):
@@ -69,7 +89,7 @@ class SearchableModelMigrationManager(ElasticObject):
 
         self.indices.create(index=new_index_name, body=index_body)
         if initial:
-            self.indices.put_alias(index=new_index_name, name=self.alias_name)
+            self._put_alias(new_index_name)
 
         return new_index_name
 
@@ -109,11 +129,13 @@ class SearchableModelMigrationManager(ElasticObject):
 
         def run():
             # reindex the documents from the old index onto the new index
-            helpers.reindex(elasticsearch, old_name, new_name)
+            with self.bulk_load(new_name):
+                helpers.reindex(self.elasticsearch, old_name, new_name,
+                    chunk_size=self._chunk_size)
             # setup the alias for the new index
-            self.indices.put_alias(name=self.alias_name, index=new_name)
+            self._put_alias(new_name)
             # delete the old alias
-            self.indices.delete_alias(name=self.alias_name, index=old_name)
+            self._delete_alias(old_name)
             # delete all the documents in the old index (keep the mapping in case one
             # needs to role back to an older schema
             self.delete_by_query(index=old_name,
@@ -132,3 +154,49 @@ class SearchableModelMigrationManager(ElasticObject):
             revision = str(int(revision) + (-1 if previous is True else 1))
         return "{alias}_{revision}".format(alias=alias, revision=revision)
 
+    @contextmanager
+    def bulk_load(self, index=None, force_merge=True, max_num_segments=None,
+            wait_for_status="green", timeout="10m"):
+        """ tunes the physical `index` (defaults to the currently aliased one) for
+        bulk loading: no refreshes, no replicas and no translog fsync per request.
+        the original settings are restored on the way out, even when the block
+        raises. on success the index is then optionally force merged, and the
+        cluster health is awaited until it reaches `wait_for_status`.
+        >>> with MyIndex().bulk_load() as index_name:
+        ...     send_chunks_to_es(ChunkSerializer(queryset, op_type="index"))
+        """
+        index = index or self._get_current_index_name()
+        current = self.indices.get_settings(index=index)[index]["settings"]["index"]
+        original = {
+            "refresh_interval": current.get("refresh_interval", "1s"),
+            "number_of_replicas": current.get("number_of_replicas", 1),
+            "translog.durability": current.get("translog", {}).get("durability",
+                "request"),
+        }
+
+        self.indices.put_settings(index=index, body={"index": BULK_LOAD_SETTINGS})
+        try:
+            yield index
+        finally:
+            self.indices.put_settings(index=index, body={"index": original})
+
+        if force_merge:
+            # `optimize` was renamed to `forcemerge` in elasticsearch 2.1
+            merge = getattr(self.indices, "forcemerge", None) or self.indices.optimize
+            merge(index=index, max_num_segments=max_num_segments)
+        if wait_for_status:
+            self.elasticsearch.cluster.health(index=index,
+                wait_for_status=wait_for_status, timeout=timeout)
+
+    def rebuild_index(self, models=None, **bulk_load_options):
+        """ sends every row of `models` (defaults to all the models in this index)
+        to the current index inside `bulk_load`.
+        """
+        from elasticmodels.utils.bulk import (ChunkSerializer, send_chunks_to_es,
+            indexable_queryset)
+
+        with self.bulk_load(**bulk_load_options):
+            for model in models or self.models:
+                chunker = ChunkSerializer(indexable_queryset(model),
+                    op_type="index", chunk_size=self._chunk_size)
+                send_chunks_to_es(chunker, elasticsearch=self.write_connections)
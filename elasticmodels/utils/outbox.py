@@ -0,0 +1,172 @@
+# utils/outbox.py
+# author: andrew young
+# email: ayoung@thewulf.org
+
+from collections import OrderedDict, defaultdict
+
+from django.apps import apps
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+
+from elasticsearch.exceptions import ConnectionError
+
+
+INDEX = "index"
+DELETE = "delete"
+
+
+def outbox_enabled():
+    """ with `ES_OUTBOX` the sync receivers and bulk queryset operations only record
+    (model, pk, op) rows in the outbox table, in the same transaction as the
+    change itself. `drain_index_outbox` ships them to elasticsearch in bulk.
+    """
+    return getattr(settings, "ES_OUTBOX", False)
+
+
+def _outbox_model():
+    from elasticmodels.models import IndexOutbox
+    return IndexOutbox
+
+
+def model_label(model):
+    return "{0}.{1}".format(model._meta.app_label, model._meta.object_name)
+
+
+def enqueue(instance, op, using=None):
+    """ records that the document of `instance` has to be indexed or deleted
+    """
+    routing = instance._search_meta.get_routing(instance) if op == DELETE else None
+    _outbox_model().objects.using(using).create(model=model_label(type(instance)),
+        object_pk=str(instance.pk), op=op, routing=routing)
+
+
+def enqueue_many(model, pks, op, routings=None, using=None):
+    """ records a whole batch of `pks` with one INSERT
+    """
+    IndexOutbox = _outbox_model()
+    routings = routings or {}
+    label = model_label(model)
+    IndexOutbox.objects.using(using).bulk_create([IndexOutbox(model=label,
+        object_pk=str(pk), op=op, routing=routings.get(pk)) for pk in pks])
+
+
+def collapse(rows):
+    """ reduces a batch of outbox rows to the last operation of each document, in
+    a dict of model label -> {op: {pk: routing}}
+    """
+    latest = OrderedDict()
+    for row in sorted(rows, key=lambda row: row.pk):
+        latest.pop((row.model, row.object_pk), None)
+        latest[(row.model, row.object_pk)] = row
+
+    operations = defaultdict(lambda: {INDEX: {}, DELETE: {}})
+    for (label, pk), row in latest.items():
+        operations[label][row.op][pk] = row.routing
+    return operations
+
+
+def max_attempts():
+    """ failed deliveries after which an outbox row is dead-lettered: it stays in
+    the table, with its `last_error`, but is no longer claimed
+    """
+    return getattr(settings, "ES_OUTBOX_MAX_ATTEMPTS", 5)
+
+
+def ship(model, operations):
+    """ sends the collapsed `operations` of `model`, see `collapse`
+    """
+    from elasticmodels.utils import collect_indices
+    from elasticmodels.utils.bulk import (ChunkSerializer, send_chunks_to_es,
+        remove_documents, indexable_queryset)
+
+    manager = model.objects
+    if operations[INDEX]:
+        index = collect_indices(manager.index_name)
+        if not isinstance(index, (list, tuple)):
+            index.maybe_rollover()
+        # rows deleted since are simply not found, their delete follows
+        chunker = ChunkSerializer(indexable_queryset(model), op_type=INDEX,
+            pks=list(operations[INDEX]), chunk_size=manager._chunk_size)
+        send_chunks_to_es(chunker, elasticsearch=manager.write_connections)
+    if operations[DELETE]:
+        deletes = operations[DELETE]
+        routings = deletes if model._search_meta.routing_field else None
+        remove_documents(model, list(deletes),
+            elasticsearch=manager.write_connections,
+            chunk_size=manager._chunk_size, routings=routings)
+
+
+def _claim(queryset):
+    # `skip_locked` came with django 1.11, older versions wait for the locks
+    try:
+        return queryset.select_for_update(skip_locked=True)
+    except TypeError:
+        return queryset.select_for_update()
+
+
+def _try_ship(model, operations, using=None):
+    """ ships `operations`, returns the error or None. the database work runs in a
+    savepoint, a failure leaves the rest of the batch usable. an unreachable
+    cluster is not the fault of the rows, it aborts the whole batch.
+    """
+    try:
+        with transaction.atomic(using=using):
+            ship(model, operations)
+    except ConnectionError:
+        raise
+    except Exception as error:
+        return error
+    return None
+
+
+def drain(batch_size=500, using=None):
+    """ claims at most `batch_size` outbox rows with `SELECT ... FOR UPDATE SKIP
+    LOCKED`, so several workers can drain concurrently, and sends their documents
+    with one query per model and chunked `_bulk` requests. the shipped rows are
+    removed in the same transaction, an unreachable cluster leaves them all for the
+    next run.
+
+    when a model fails, its documents are retried one at a time to find the rows at
+    fault, the others are shipped. a failing row gets its `attempts` counted and
+    its `last_error` recorded, and is skipped once `ES_OUTBOX_MAX_ATTEMPTS` is
+    reached, so it can not hold back the rows behind it.
+    returns the number of rows claimed.
+    """
+    IndexOutbox = _outbox_model()
+    with transaction.atomic(using=using):
+        rows = list(_claim(IndexOutbox.objects.using(using).filter(
+            attempts__lt=max_attempts())).order_by("pk")[:batch_size])
+        if not rows:
+            return 0
+
+        failed = {}
+        for label, operations in collapse(rows).items():
+            model = apps.get_model(label)
+            error = _try_ship(model, operations, using=using)
+            if error is None:
+                continue
+            for op, documents in operations.items():
+                for pk, routing in documents.items():
+                    single = {INDEX: {}, DELETE: {}}
+                    single[op][pk] = routing
+                    error = _try_ship(model, single, using=using)
+                    if error is not None:
+                        failed[(label, pk)] = error
+
+        shipped = [row.pk for row in rows if (row.model, row.object_pk) not in
+            failed]
+        IndexOutbox.objects.using(using).filter(pk__in=shipped).delete()
+        for row in rows:
+            error = failed.get((row.model, row.object_pk))
+            if error is not None:
+                IndexOutbox.objects.using(using).filter(pk=row.pk).update(
+                    attempts=F("attempts") + 1, last_error=repr(error))
+    return len(rows)
+
+
+def dead_letters(using=None):
+    """ the outbox rows that are no longer claimed after failing too often
+    """
+    return _outbox_model().objects.using(using).filter(
+        attempts__gte=max_attempts())
@@ -0,0 +1,98 @@
+# utils/profiling.py
+# author: andrew young
+# email: ayoung@thewulf.org
+
+import json
+import time
+from contextlib import contextmanager
+
+from django.utils import six
+
+from elasticsearch.client.utils import _make_path
+
+
+class SearchProfile(object):
+    """ where the time of a single search went, every phase in milliseconds:
+        build      serializing the request body
+        es_took    the time elasticsearch reports it spent on the search (`took`)
+        network    the round trip minus `took`, ie transfer and queueing
+        decode     parsing the response json
+        hydration  loading the hits from the database
+    `es_profile` holds the output of the elasticsearch profile api when it was
+    requested.
+    """
+    phases = ("build", "es_took", "network", "decode", "hydration")
+
+    def __init__(self):
+        self.timings = dict.fromkeys(self.phases, 0.0)
+        self.response_bytes = 0
+        self.es_profile = None
+
+    def __repr__(self):
+        return "{0}({1})".format(self.__class__.__name__, ", ".join(
+            "{0}={1:.2f}ms".format(phase, self.timings[phase]) for phase in
+                self.phases))
+
+    @property
+    def total(self):
+        return sum(self.timings.values())
+
+    @contextmanager
+    def timing(self, phase):
+        start = time.time()
+        try:
+            yield
+        finally:
+            self.timings[phase] += (time.time() - start) * 1000
+
+
+def _query_param(value):
+    if isinstance(value, bool):
+        return "true" if value else "false"
+    if isinstance(value, (list, tuple)):
+        return ",".join(value)
+    return value
+
+
+def profiled_search(elasticsearch, index=None, doc_type=None, body=None,
+        profile=None, **params):
+    """ runs a search like `Elasticsearch.search`, but straight on a transport
+    connection so the request build, network and decode phases can be timed apart.
+
+    :rtype: `(raw_results, profile)`
+    """
+    profile = profile or SearchProfile()
+    transport = elasticsearch.transport
+
+    with profile.timing("build"):
+        url = _make_path(index, doc_type, "_search")
+        params = {key: _query_param(value) for key, value in params.items()}
+        data = transport.serializer.dumps(body).encode("utf-8") \
+            if body is not None else None
+
+    connection = transport.get_connection()
+    start = time.time()
+    # error statuses are raised by the connection itself
+    status, headers, raw = connection.perform_request("POST", url, params, data)
+    round_trip = (time.time() - start) * 1000
+    # the connection hands back the decoded text
+    profile.response_bytes = len(raw.encode("utf-8")) if \
+        isinstance(raw, six.text_type) else len(raw)
+
+    with profile.timing("decode"):
+        raw_results = json.loads(raw)
+
+    profile.timings["es_took"] = float(raw_results.get("took", 0))
+    profile.timings["network"] = max(round_trip - profile.timings["es_took"], 0.0)
+    profile.es_profile = raw_results.get("profile")
+    return raw_results, profile
+
+
+def percentile(values, percent):
+    """ the `percent` percentile of `values` by nearest rank
+    """
+    values = sorted(values)
+    if not values:
+        return 0.0
+    rank = int(round(percent / 100.0 * (len(values) - 1)))
+    return values[rank]
@@ -0,0 +1,321 @@
+# utils/search.py
+# author: andrew young
+# email: ayoung@thewulf.org
+
+import copy
+
+from collections import deque
+
+from django.utils import six
+
+from elasticmodels.utils.aggregations import parse_aggregations
+from elasticmodels.utils.cache import lean_source
+from elasticmodels.utils.hydration import (hit_pk, hit_versions, hydrate_groups,
+    hydrate_pks)
+
+
+class SearchResult(object):
+    """ the outcome of a single search in a batch. when elasticsearch reported an
+    error for this search `error` is set and `objects` is empty.
+    """
+    def __init__(self, model, raw=None, error=None):
+        self.model = model
+        self.raw = raw
+        self.error = error
+        self.objects = []
+
+    def __repr__(self):
+        return "{0}({1}, hits={2}, error={3})".format(self.__class__.__name__,
+            self.model.__name__, len(self.hits), self.error)
+
+    def __iter__(self):
+        return iter(self.objects)
+
+    def __len__(self):
+        return len(self.objects)
+
+    @property
+    def ok(self):
+        return self.error is None
+
+    @property
+    def hits(self):
+        if self.raw is None:
+            return []
+        return self.raw["hits"]["hits"]
+
+    @property
+    def pks(self):
+        return [hit_pk(self.model, hit) for hit in self.hits]
+
+
+class MultiSearch(object):
+    """ collects several search bodies, for any number of models and indices, and
+    runs them in a single `_msearch` request.
+    usage:
+    >>> batch = Article.objects.multi_search()
+    >>> batch.add({"query": {"match": {"title": "django"}}})
+    >>> batch.add({"query": {"match_all": {}}}, model=Author, size=5)
+    >>> articles, authors = batch.execute()
+    >>> articles.objects, articles.raw, authors.error
+    """
+    def __init__(self, elasticsearch, default_model=None):
+        self.elasticsearch = elasticsearch
+        self.default_model = default_model
+        self.searches = []
+
+    def __len__(self):
+        return len(self.searches)
+
+    def add(self, body=None, model=None, raw_only=False, ids_only=None, **header):
+        """ queues a search. `header` takes the msearch header options such as
+        `routing`, `preference` or `search_type`. like `search_es` the `_source` is
+        left out of the response unless the hits are returned raw or `ids_only` is
+        False.
+        """
+        model = model or self.default_model
+        assert model is not None, "a model is required to add a search to the batch"
+        body = dict(body or {})
+        if ids_only is None:
+            ids_only = not raw_only
+        if ids_only:
+            body.setdefault("_source", lean_source())
+
+        header.update({"index": model._search_meta.index_name,
+            "type": model._search_meta.doctype_name})
+        self.searches.append((model, header, body, raw_only))
+        return self
+
+    def execute(self, **kwargs):
+        """ sends the batch and returns a `SearchResult` per queued search in the
+        order they were added. errors are reported per search and never fail the
+        whole batch.
+        """
+        if not self.searches:
+            return []
+
+        request = []
+        for model, header, body, raw_only in self.searches:
+            request.extend([header, body])
+        responses = self.elasticsearch.msearch(body=request, **kwargs)["responses"]
+
+        results = []
+        groups = []
+        versions = {}
+        for (model, header, body, raw_only), response in zip(self.searches,
+                responses):
+            if "error" in response:
+                result = SearchResult(model, error=response["error"])
+            else:
+                result = SearchResult(model, raw=response)
+            results.append(result)
+            hydrate = result.ok and not raw_only
+            groups.append([(model, pk) for pk in result.pks] if hydrate else [])
+            if hydrate:
+                versions.setdefault(model, {}).update(hit_versions(model,
+                    result.hits))
+
+        for result, objects in zip(results, hydrate_groups(groups, versions)):
+            result.objects = objects
+
+        self.searches = []
+        return results
+
+
+class ElasticQuerySet(object):
+    """ a lazy, chainable search against a single model. nothing is sent to
+    elasticsearch until the queryset is iterated, sliced or counted, which makes it
+    suitable for django's `Paginator`:
+    >>> articles = Article.objects.query_es({"match": {"title": "django"}})
+    >>> articles = articles.filter({"term": {"public": True}}).sort("-title")
+    >>> page = Paginator(articles, 20).page(3)  # one `_count`, one `from=40,size=20`
+
+    slices are translated to `from`/`size` and the last `max_windows` fetched
+    windows are kept, so a slice falling inside one of them never hits
+    elasticsearch again. `len()` and `count()` use `_count`, unless the total is
+    already known from a search.
+
+    the hits are kept by position, a hit whose row is gone from the database is
+    left out of the results without shifting the later ones.
+    """
+    page_size = 100
+    max_windows = 10
+    ordered = True
+
+    def __init__(self, manager, query=None):
+        self.manager = manager
+        self.model = manager.model
+        self._query = query
+        self._filters = []
+        self._sort = []
+        self._source = False
+        self._aggs = {}
+        self._params = {}
+        self._reset()
+
+    def _reset(self):
+        self._windows = deque(maxlen=self.max_windows)
+        self._count = None
+        self._aggregations = None
+        self.raw = None
+
+    def _clone(self):
+        clone = copy.copy(self)
+        clone._filters = list(self._filters)
+        clone._sort = list(self._sort)
+        clone._aggs = dict(self._aggs)
+        clone._params = dict(self._params)
+        clone._reset()
+        return clone
+
+    def __repr__(self):
+        return "<{0}: {1}>".format(self.__class__.__name__, self.to_body())
+
+    # chaining
+
+    def query(self, query):
+        clone = self._clone()
+        clone._query = query
+        return clone
+
+    def filter(self, *filters):
+        clone = self._clone()
+        clone._filters.extend(filters)
+        return clone
+
+    def sort(self, *fields):
+        """ accepts field names, optionally prefixed with "-" for descending order,
+        or raw elasticsearch sort clauses.
+        """
+        clone = self._clone()
+        for field in fields:
+            if isinstance(field, six.string_types) and field.startswith("-"):
+                field = {field[1:]: {"order": "desc"}}
+            clone._sort.append(field)
+        return clone
+
+    def source(self, fields=True):
+        """ the `_source` to request with the hits, by default none is transferred.
+        """
+        clone = self._clone()
+        clone._source = fields
+        return clone
+
+    def aggregate(self, **aggs):
+        clone = self._clone()
+        clone._aggs.update(aggs)
+        return clone
+
+    def routing(self, routing):
+        """ only search the shard(s) of `routing`, see `MappingMeta.routing_field`
+        """
+        return self.params(routing=routing)
+
+    def params(self, **params):
+        """ extra search parameters such as `routing` or `preference`
+        """
+        clone = self._clone()
+        clone._params.update(params)
+        return clone
+
+    # building
+
+    def _build_query(self):
+        if not self._filters:
+            return self._query
+        return {"bool": {"must": self._query or {"match_all": {}},
+            "filter": self._filters}}
+
+    def to_body(self, start=None, size=None):
+        body = {"_source": lean_source() if self._source is False else self._source}
+        query = self._build_query()
+        if query is not None:
+            body["query"] = query
+        if self._sort:
+            body["sort"] = self._sort
+        if self._aggs:
+            body["aggs"] = self._aggs
+        if start is not None:
+            body["from"] = start
+        if size is not None:
+            body["size"] = size
+        return body
+
+    # evaluation
+
+    def _fetch(self, start, stop):
+        body = self.to_body(start=start, size=stop - start)
+        if self._aggregations is not None:
+            body.pop("aggs", None)
+        self.raw = raw = self.manager.search(body=body, **self._params)
+
+        total = raw["hits"]["total"]
+        self._count = total["value"] if isinstance(total, dict) else total
+        if self._aggs and self._aggregations is None:
+            self._aggregations = parse_aggregations(self._aggs,
+                raw.get("aggregations", {}), model=self.model)
+
+        hits = raw["hits"]["hits"]
+        pks = [hit_pk(self.model, hit) for hit in hits]
+        loaded = dict((instance.pk, instance) for instance in
+            hydrate_pks(self.model, pks, hit_versions(self.model, hits)))
+        # one slot per hit, None for the rows deleted since they were indexed
+        objects = [loaded.get(pk) for pk in pks]
+        if stop > start:
+            self._windows.append((start, stop, objects))
+        return objects
+
+    def _window(self, start, stop):
+        for window_start, window_stop, objects in self._windows:
+            if window_start <= start and stop <= window_stop:
+                break
+        else:
+            window_start, objects = start, self._fetch(start, stop)
+        return [instance for instance in
+            objects[start - window_start:stop - window_start] if instance is not None]
+
+    def __getitem__(self, k):
+        if isinstance(k, slice):
+            if k.step is not None:
+                raise ValueError("ElasticQuerySet does not support slice steps.")
+            start = k.start or 0
+            stop = k.stop if k.stop is not None else self.count()
+            assert start >= 0 and stop >= 0, "Negative indexing is not supported."
+            if stop <= start:
+                return []
+            return self._window(start, stop)
+
+        assert k >= 0, "Negative indexing is not supported."
+        objects = self._window(k, k + 1)
+        if not objects:
+            raise IndexError("ElasticQuerySet index out of range")
+        return objects[0]
+
+    def __iter__(self):
+        start = 0
+        while self._count is None or start < self._count:
+            for instance in self._window(start, start + self.page_size):
+                yield instance
+            start += self.page_size
+
+    def count(self):
+        if self._count is None:
+            self._count = self.manager.count_es(self._build_query(),
+                **self._params)
+        return self._count
+
+    def __len__(self):
+        return self.count()
+
+    def __bool__(self):
+        return self.count() > 0
+    __nonzero__ = __bool__
+
+    @property
+    def aggregations(self):
+        """ the parsed aggregations, see `parse_aggregations`. when no window has
+        been fetched yet a `size=0` search is run.
+        """
+        if self._aggregations is None:
+            self._fetch(0, 0)
+        return self._aggregations
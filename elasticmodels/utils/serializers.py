@@ -4,6 +4,7 @@
 
 import datetime
 import decimal
+from collections import OrderedDict
 import uuid
 import json
 
@@ -15,6 +16,25 @@ from django.utils.encoding import force_text
 from django.utils.functional import Promise
 
 
+class LazyJSON(object):
+    """ an encoded JSON document, as read from the database, that is only decoded
+    when its value is actually needed. until then the raw string can be written
+    back or embedded into other documents as is.
+    """
+    __slots__ = ("raw", "load_kwargs", "display")
+
+    def __init__(self, raw, load_kwargs=None):
+        self.raw = raw
+        self.load_kwargs = load_kwargs or {}
+        self.display = None
+
+    def __repr__(self):
+        return "{0}({1!r})".format(self.__class__.__name__, self.raw)
+
+    def decode(self):
+        return json.loads(self.raw, **self.load_kwargs)
+
+
 class JSONEncoder(json.JSONEncoder):
     """
     JSONEncoder subclass that knows how to encode date/time/timedelta,
@@ -26,6 +46,8 @@ class JSONEncoder(json.JSONEncoder):
         # http://ecma-international.org/ecma-262/5.1/#sec-15.9.1.15
         if isinstance(obj, Promise):
             return force_text(obj)
+        elif isinstance(obj, LazyJSON):
+            return obj.decode()
         elif isinstance(obj, datetime.datetime):
             representation = obj.isoformat()
             if obj.microsecond:
@@ -101,25 +123,241 @@ class ModelJSONSerializer(object):
         try:
             return getattr(self, method_name)(self.instance)
         except AttributeError:
+            suggest_field = self.instance._search_meta.suggest_fields.get(field_name)
+            if suggest_field is not None:
+                return suggest_field.serialize(self.instance)
             # if this raises an error we can count on the fact this is a
             # custom/virtual field
             field = self.get_field(field_name)
 
         if field.rel:
-            related = getattr(self.instance, field.name).all() if \
-                isinstance(field, ManyToManyField) else \
-                [getattr(self.instance, field.name), ]
-            app_path = related[0].label
-            return {"id": [rel.pk for rel in related], "value": app_path}
+            if isinstance(field, ManyToManyField):
+                pks = [rel.pk for rel in getattr(self.instance, field.name).all()]
+            else:
+                pk = getattr(self.instance, field.attname)
+                pks = [] if pk is None else [pk]
+            return related_document(field, pks)
 
+        # undecoded json fields are passed on as is, see `serialize`
+        value = self.instance.__dict__.get(field.attname)
+        if isinstance(value, LazyJSON):
+            return value
         return getattr(self.instance, field.name)
 
-    def serialize(self, to_json=True):
+    def serialize(self, to_json=True, fields=None):
+        """
+        :param fields: the names of the mapped fields to serialize, defaults to all
+        """
+        return dump_document(self.document(fields=fields), to_json)
+
+    def document(self, fields=None):
+        """ the document as a dict, not dumped yet (see `dump_document`)
+        """
         model_dict = dict()
         for field in self.fields:
+            if fields is not None and field.name not in fields:
+                continue
             try:
                 model_dict[field.name] = self.serialize_field(field.name)
             except FieldDoesNotExist:
                 raise AttributeError("serialize_{0} method not found".format(field.name))
-        return json.dumps(model_dict, cls=JSONEncoder) if to_json else model_dict
+
+        self.instance._search_meta.minimize_document(model_dict,
+            partial=fields is not None)
+        return model_dict
+
+
+def dump_document(model_dict, to_json=True):
+    """ the document as a dict, or as json text with the raw json of undecoded
+    `LazyJSON` values embedded as is.
+    """
+    lazy = {name: value for name, value in model_dict.items() if
+        isinstance(value, LazyJSON)}
+    if not to_json:
+        model_dict.update((name, value.decode()) for name, value in lazy.items())
+        return model_dict
+
+    for name in lazy:
+        del model_dict[name]
+    body = json.dumps(model_dict, cls=JSONEncoder, separators=(",", ":"))
+    if lazy:
+        # embed the raw json of the lazy values without decoding them
+        raw = ",".join("{0}:{1}".format(json.dumps(name), value.raw) for
+            name, value in lazy.items())
+        body = "{0}{1}{2}}}".format(body[:-1], "," if model_dict else "", raw)
+    return body
+
+
+def _related_model(field):
+    related = getattr(field, "related_model", None)
+    return related if related is not None else field.rel.to
+
+
+def related_document(field, pks):
+    """ the document of a relation: the related pks and the "app_label.ObjectName"
+    of the related model.
+    """
+    opts = _related_model(field)._meta
+    return {"id": pks, "value": "{0}.{1}".format(opts.app_label, opts.object_name)}
+
+
+def _method(klass, name):
+    method = getattr(klass, name)
+    return getattr(method, "__func__", method)
+
+
+class ValuesSerializer(object):
+    """ serializes whole chunks of documents straight from `values()` rows, without
+    building model instances. the mapped columns are read in the chunk query, each
+    many to many relation takes one query on its through table per chunk, and only
+    the fields with a `serialize_<field>` method on the models serializer class
+    need instances, loaded with one `in_bulk` per chunk.
+    usage:
+    >>> serializer = ValuesSerializer(Article)
+    >>> for rows in queryset_chunker(serializer.values(Article.objects.all())):
+    ...     for pk, row, body in serializer.serialize_rows(rows):
+    ...         pass
+    """
+    def __init__(self, model, fields=None):
+        """
+        :param fields: only serialize these mapped fields, for partial `update` docs
+        """
+        from elasticmodels.utils.fields import JSONFieldBase
+
+        search_meta = model._search_meta
+        self.model = model
+        self.search_meta = search_meta
+        self.partial = fields is not None
+        self.serializer_class = search_meta.serializer_class
+        self.columns = OrderedDict()
+        self.json_columns = {}
+        self.relations = []
+        self.many_to_many = []
+        self.suggest = OrderedDict()
+        self.custom = []
+        for search_field in search_meta.fields:
+            name = search_field.name
+            if fields is not None and name not in fields:
+                continue
+            if hasattr(self.serializer_class, "serialize_{0}".format(name)):
+                self.custom.append(name)
+                continue
+            if name in search_meta.suggest_fields:
+                source = search_field.source
+                if callable(source) or not self._is_column(source):
+                    self.custom.append(name)
+                else:
+                    self.suggest[name] = model._meta.get_field(source).attname
+                continue
+            try:
+                field = model._meta.get_field(name)
+            except FieldDoesNotExist:
+                raise AttributeError("serialize_{0} method not found".format(name))
+            if isinstance(field, ManyToManyField):
+                self.many_to_many.append(field)
+            else:
+                self.columns[name] = field.attname
+                if field.rel:
+                    self.relations.append(field)
+                if isinstance(field, JSONFieldBase):
+                    self.json_columns[name] = field.load_kwargs
+
+        # routing and version attributes have to be readable from the rows
+        self.attributes = OrderedDict([("pk", "pk")])
+        self.instance_routing = callable(search_meta.routing_field)
+        for attribute in (search_meta.routing_attname, search_meta.version_field):
+            if attribute is not None:
+                self.attributes[attribute] = model._meta.get_field(attribute).attname
+
+    @classmethod
+    def supports(cls, model):
+        """ whether the documents of `model` can be built from rows: serializer
+        classes overriding `serialize` or `serialize_field` need instances.
+        """
+        serializer_class = model._search_meta.serializer_class
+        return all(_method(serializer_class, name) is
+            _method(ModelJSONSerializer, name) for name in ("serialize",
+            "serialize_field"))
+
+    def _is_column(self, name):
+        try:
+            field = self.model._meta.get_field(name)
+        except FieldDoesNotExist:
+            return False
+        return getattr(field, "concrete", True) and not field.rel
+
+    def values(self, queryset):
+        """ the `values()` queryset reading the mapped columns
+        """
+        return queryset.values(*set(self.columns.values()) |
+            set(self.attributes.values()) | set(self.suggest.values()))
+
+    def serialize_rows(self, rows, to_json=True):
+        """ yields `(pk, row, document)` for each `values()` row of a chunk. `row`
+        is the model instance when one was needed, otherwise a `ValuesRow`.
+        """
+        for pk, row, model_dict in self.documents(rows):
+            yield pk, row, dump_document(model_dict, to_json)
+
+    def documents(self, rows):
+        """ `serialize_rows` with the documents as dicts, not dumped yet. runs every
+        query the chunk needs.
+        """
+        pks = [row["pk"] for row in rows]
+        many_to_many = [(field, self._related_pks(field, pks)) for field in
+            self.many_to_many]
+        instances = {}
+        if self.custom or self.instance_routing:
+            instances = self.model._default_manager.in_bulk(pks)
+
+        for row in rows:
+            pk = row["pk"]
+            instance = instances.get(pk)
+            if (self.custom or self.instance_routing) and instance is None:
+                # deleted while the chunk was serialized
+                continue
+            model_dict = dict((name, row[column]) for name, column in
+                self.columns.items())
+            for name, load_kwargs in self.json_columns.items():
+                # embedded as read, like the undecoded values of instances
+                if isinstance(model_dict[name], six.string_types):
+                    model_dict[name] = LazyJSON(model_dict[name], load_kwargs)
+            for field in self.relations:
+                value = model_dict.get(field.name)
+                model_dict[field.name] = related_document(field,
+                    [] if value is None else [value])
+            for field, related in many_to_many:
+                model_dict[field.name] = related_document(field, related.get(pk, []))
+            for name, column in self.suggest.items():
+                model_dict[name] = self.search_meta.suggest_fields[name].inputs(
+                    row[column])
+            if self.custom:
+                serializer = self.serializer_class(instance)
+                for name in self.custom:
+                    model_dict[name] = serializer.serialize_field(name)
+            self.search_meta.minimize_document(model_dict, partial=self.partial)
+            yield pk, instance or ValuesRow(self.model, row, self.attributes), \
+                model_dict
+
+    def _related_pks(self, field, pks):
+        """ the related pks of `pks` through a many to many `field`, in one query
+        """
+        through = field.rel.through
+        source = through._meta.get_field(field.m2m_field_name()).attname
+        target = through._meta.get_field(field.m2m_reverse_field_name()).attname
+        related = {}
+        for pk, related_pk in through._default_manager.filter(**{
+                "{0}__in".format(source): pks}).values_list(source, target):
+            related.setdefault(pk, []).append(related_pk)
+        return related
+
+
+class ValuesRow(object):
+    """ a `values()` row that reads like an instance, for the routing and version
+    attributes.
+    """
+    def __init__(self, model, row, attributes):
+        self._search_meta = model._search_meta
+        for name, column in attributes.items():
+            setattr(self, name, row[column])
 
@@ -0,0 +1,133 @@
+# utils/singleflight.py
+# author: andrew young
+# email: ayoung@thewulf.org
+
+import copy
+import json
+import sys
+import threading
+
+from django.conf import settings
+from django.utils import six
+
+
+class Call(object):
+    """ a request in flight. the leader runs it, every identical request made in
+    the meantime waits on it and gets its own deep copy of the result, or the same
+    error.
+    """
+    def __init__(self):
+        self.event = threading.Event()
+        self.result = None
+        self.error = None
+        self.waiters = 0
+
+    def wait(self, timeout=None):
+        """ blocks until the leader is done. an async caller can run this in an
+        executor, ie `await loop.run_in_executor(None, call.wait)`
+        """
+        if not self.event.wait(timeout):
+            raise RuntimeError("timed out waiting for a coalesced request")
+        if self.error is not None:
+            six.reraise(*self.error)
+        return copy.deepcopy(self.result)
+
+
+class SingleFlight(object):
+    """ coalesces identical concurrent requests within the process: while one is
+    in flight, the same request from any other thread waits for it instead of
+    reaching the cluster. nothing is kept once it completes, this only stops
+    stampedes, see `ES_COALESCE_SEARCHES`.
+    usage:
+    >>> flight = SingleFlight()
+    >>> flight.do(request_key(index, body), lambda: es.search(index, body=body))
+
+    or, for a path that can not block on `do` (ie async code):
+    >>> call, leader = flight.begin(key)
+    >>> if leader:
+    ...     flight.run(key, call, func)
+    ... else:
+    ...     call.wait()
+    """
+    def __init__(self):
+        self._calls = {}
+        self._lock = threading.Lock()
+        self._metrics = {"requests": 0, "coalesced": 0, "errors": 0}
+
+    def begin(self, key):
+        """ the call in flight for `key`, and whether the caller leads it
+        """
+        with self._lock:
+            self._metrics["requests"] += 1
+            call = self._calls.get(key)
+            if call is not None:
+                call.waiters += 1
+                self._metrics["coalesced"] += 1
+                return call, False
+            call = self._calls[key] = Call()
+            return call, True
+
+    def run(self, key, call, func):
+        """ runs `func` as the leader of `call` and hands its outcome to the waiters
+        """
+        try:
+            result = func()
+        except Exception:
+            self._finish(key, call, error=sys.exc_info())
+            raise
+        self._finish(key, call, result=result)
+        return result
+
+    def do(self, key, func):
+        call, leader = self.begin(key)
+        if not leader:
+            return call.wait()
+        return self.run(key, call, func)
+
+    def _finish(self, key, call, result=None, error=None):
+        with self._lock:
+            # no one can join the call once it is out of `_calls`
+            del self._calls[key]
+            if error is not None:
+                self._metrics["errors"] += 1
+        if call.waiters:
+            # the leader keeps the original, the waiters copy a pristine copy
+            call.result = copy.deepcopy(result)
+        call.error = error
+        call.event.set()
+
+    def metrics(self):
+        """ the number of requests, of those that were coalesced into another
+        and of failed calls
+        """
+        with self._lock:
+            return dict(self._metrics)
+
+    def reset_metrics(self):
+        with self._lock:
+            for name in self._metrics:
+                self._metrics[name] = 0
+
+
+search_flight = SingleFlight()
+
+
+def coalescing_enabled():
+    return getattr(settings, "ES_COALESCE_SEARCHES", False)
+
+
+def request_key(*parts):
+    """ a key identifying a request by its target and parameters
+    """
+    return json.dumps(parts, sort_keys=True, default=six.text_type,
+        separators=(",", ":"))
+
+
+def coalesced(func, *key_parts, **kwargs):
+    """ `func(**kwargs)`, coalesced with identical concurrent calls when
+    `ES_COALESCE_SEARCHES` is set
+    """
+    if not coalescing_enabled():
+        return func(**kwargs)
+    key = request_key(*(key_parts + (kwargs,)))
+    return search_flight.do(key, lambda: func(**kwargs))
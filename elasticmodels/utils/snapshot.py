@@ -0,0 +1,105 @@
+# utils/snapshot.py
+# author: andrew young
+# email: ayoung@thewulf.org
+
+import gzip
+import io
+import json
+import sys
+import threading
+
+from django.utils import six
+
+from elasticsearch import helpers
+from elasticsearch.helpers import BulkIndexError
+
+
+def _open(path, mode="rb", compresslevel=6):
+    if path.endswith(".gz"):
+        return gzip.open(path, mode, compresslevel=compresslevel)
+    return io.open(path, mode)
+
+
+def export_alias(elasticsearch, alias, path, slices=1, chunk_size=500,
+        compresslevel=6, routing=None):
+    """ streams every document of `alias` to `path` as bulk formatted NDJSON, a
+    metadata line followed by the `_source` line, gzipped when `path` ends with
+    ".gz". with `slices` greater than 1 a sliced scroll is read by as many threads,
+    the first error of any of them is raised once they are all done; memory stays
+    constant either way. a `routing` limits the export to the documents of that
+    routing's shard.
+
+    :rtype: the number of documents written
+    """
+    lock = threading.Lock()
+    counts = []
+    errors = []
+
+    def export_slice(out, slice_id=None):
+        body = {"query": {"match_all": {}}}
+        if slice_id is not None:
+            body["slice"] = {"id": slice_id, "max": slices}
+        count = 0
+        params = {"routing": routing} if routing is not None else {}
+        for hit in helpers.scan(elasticsearch, index=alias, query=body,
+                size=chunk_size, preserve_order=False, **params):
+            meta = {"_type": hit["_type"], "_id": hit["_id"]}
+            if "_routing" in hit:
+                meta["_routing"] = hit["_routing"]
+            lines = "{0}\n{1}\n".format(json.dumps({"index": meta}),
+                json.dumps(hit["_source"], separators=(",", ":")))
+            with lock:
+                out.write(lines.encode("utf-8"))
+            count += 1
+        counts.append(count)
+
+    def export_slice_in_thread(out, slice_id):
+        try:
+            export_slice(out, slice_id)
+        except Exception:
+            errors.append(sys.exc_info())
+
+    with _open(path, "wb", compresslevel=compresslevel) as out:
+        if slices > 1:
+            threads = [threading.Thread(target=export_slice_in_thread,
+                args=(out, slice_id)) for slice_id in range(slices)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            if errors:
+                six.reraise(*errors[0])
+        else:
+            export_slice(out)
+
+    return sum(counts)
+
+
+def _send_bulk_body(elasticsearch, index, lines):
+    response = elasticsearch.bulk(body="".join(lines), index=index)
+    if response.get("errors"):
+        errors = [item for item in response["items"]
+            if item.get("index", {}).get("status", 200) >= 300]
+        raise BulkIndexError("{0} document(s) failed to import.".format(len(errors)),
+            errors)
+    return len(response["items"])
+
+
+def import_snapshot(elasticsearch, path, index, chunk_size=500):
+    """ bulk loads a file written by `export_alias` into `index`, reading it line by
+    line. the `_source` lines are sent exactly as they were read, no serializer
+    runs and nothing is decoded besides the metadata lines.
+
+    :rtype: the number of documents imported
+    """
+    imported = 0
+    lines = []
+    with _open(path, "rb") as snapshot:
+        for line in snapshot:
+            lines.append(line.decode("utf-8"))
+            if len(lines) >= chunk_size * 2:
+                imported += _send_bulk_body(elasticsearch, index, lines)
+                lines = []
+    if lines:
+        imported += _send_bulk_body(elasticsearch, index, lines)
+    return imported
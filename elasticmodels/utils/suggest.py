@@ -0,0 +1,101 @@
+# utils/suggest.py
+# author: andrew young
+# email: ayoung@thewulf.org
+
+import threading
+import time
+from collections import defaultdict
+
+from django.conf import settings
+
+from elasticmodels.utils.cache import LRUCache
+from elasticmodels.utils.hydration import hit_pk
+
+
+SUGGESTION = "suggestion"
+
+
+class SuggestCache(object):
+    """ an in process cache of the suggestions for short prefixes, the ones most
+    typed and slowest to complete. every model has a generation that saves and
+    deletes bump, so its cached suggestions are never read again. as other
+    processes can not bump it, entries also expire after `ES_SUGGEST_CACHE_TTL`
+    seconds.
+    """
+    def __init__(self, maxsize=None):
+        if maxsize is None:
+            maxsize = getattr(settings, "ES_SUGGEST_CACHE_SIZE", 10000)
+        self._cache = LRUCache(maxsize)
+        self._generations = defaultdict(int)
+        self._lock = threading.Lock()
+
+    @property
+    def max_prefix_length(self):
+        return getattr(settings, "ES_SUGGEST_CACHE_PREFIX_LENGTH", 3)
+
+    @property
+    def ttl(self):
+        return getattr(settings, "ES_SUGGEST_CACHE_TTL", 60)
+
+    def generation(self, model):
+        return self._generations[model]
+
+    def bump(self, model):
+        """ invalidates every cached suggestion of `model`
+        """
+        with self._lock:
+            self._generations[model] += 1
+
+    def cacheable(self, prefix):
+        return len(prefix) <= self.max_prefix_length
+
+    def key(self, model, prefix, *options):
+        return (model, self.generation(model), prefix.lower()) + options
+
+    def get(self, key):
+        found = self._cache.get_many([key]).get(key)
+        if found is None:
+            return None
+        stored, suggestions = found
+        if time.time() - stored > self.ttl:
+            return None
+        return [dict(suggestion) for suggestion in suggestions]
+
+    def set(self, key, suggestions):
+        self._cache.set_many({key: (time.time(), [dict(suggestion) for suggestion in
+            suggestions])})
+
+    def clear(self):
+        self._cache.clear()
+
+
+suggest_cache = SuggestCache()
+
+
+def suggest_body(field, prefix, size=10, fuzzy=None, contexts=None):
+    """ the search body of a completion suggestion for `prefix`, transferring only
+    the payload fields of the suggest `field`
+    """
+    completion = {"field": field.name, "size": size}
+    if fuzzy is not None:
+        completion["fuzzy"] = fuzzy if isinstance(fuzzy, dict) else \
+            {"fuzziness": fuzzy}
+    if contexts is not None:
+        completion["contexts"] = contexts
+    return {"_source": field.payload or False,
+        "suggest": {SUGGESTION: {"prefix": prefix, "completion": completion}}}
+
+
+def parse_suggestions(model, response):
+    """ flattens a completion suggest response into a list of
+    `{"text", "pk", "score", <payload fields>}` dicts, in order. nothing is loaded
+    from the database.
+    """
+    suggestions = []
+    for entry in response.get("suggest", {}).get(SUGGESTION, []):
+        for option in entry.get("options", []):
+            suggestion = dict(option.get("_source") or {})
+            suggestion.update(text=option["text"], pk=hit_pk(model, option),
+                score=option.get("_score", option.get("score")))
+            suggestions.append(suggestion)
+    return suggestions
@@ -0,0 +1,45 @@
+# utils/sync.py
+# author: andrew young
+# email: ayoung@thewulf.org
+
+import threading
+from contextlib import contextmanager
+
+from django.db import transaction
+
+
+_state = threading.local()
+
+
+def _suppressed_models():
+    if not hasattr(_state, "models"):
+        _state.models = []
+    return _state.models
+
+
+@contextmanager
+def suppress_sync(model):
+    """ within this block the automatic per instance sync receivers ignore `model`
+    (and its subclasses) in the current thread. used by the bulk paths, which
+    update elasticsearch themselves.
+    """
+    models = _suppressed_models()
+    models.append(model)
+    try:
+        yield
+    finally:
+        models.remove(model)
+
+
+def sync_suppressed(model):
+    return any(issubclass(model, suppressed) for suppressed in _suppressed_models())
+
+
+def on_commit(func, using=None):
+    """ runs `func` once the current transaction commits, or right away when there
+    is no transaction (or django is too old to support `on_commit`).
+    """
+    if hasattr(transaction, "on_commit"):
+        transaction.on_commit(func, using=using)
+    else:
+        func()
@@ -0,0 +1,168 @@
+# utils/templates.py
+# author: andrew young
+# email: ayoung@thewulf.org
+
+import json
+import re
+
+from django.conf import settings
+
+from elasticmodels.utils.cache import LRUCache, lean_source
+
+
+# a json string that is nothing but a placeholder, ie "{{size}}"
+PLACEHOLDER = re.compile(r'"\{\{\s*(\w+)\s*\}\}"')
+
+# the parameter filling in the `_source` of templates that do not set their own
+SOURCE_PARAM = "_source"
+
+
+class TemplateParamError(KeyError): pass
+
+
+class SearchTemplate(object):
+    """ a search body declared once, in python, with `"{{param}}"` placeholders:
+    >>> SearchTemplate("by_title", {"query": {"match": {"title": "{{title}}"}},
+    ...     "size": "{{size}}"})
+
+    a placeholder must be a whole json string and is replaced by the json of its
+    parameter, so any value (strings, numbers, lists, dicts) can be passed. the
+    template is uploaded to the cluster as a mustache stored script, so a search
+    only sends the template id and the params, or it is rendered client side where
+    the body is compiled once into static json chunks and parameter slots.
+    """
+    def __init__(self, name, body):
+        self.name = name
+        self.body = body
+        self._chunks = None
+
+    def __repr__(self):
+        return "{0}({1})".format(self.__class__.__name__, self.name)
+
+    @property
+    def source(self):
+        """ the template as json text with the placeholders left in. unless the body
+        sets its own `_source`, it is a placeholder too, see `source_params`.
+        """
+        body = dict(self.body)
+        body.setdefault("_source", "{{%s}}" % SOURCE_PARAM)
+        return json.dumps(body, separators=(",", ":"), sort_keys=True)
+
+    @property
+    def params(self):
+        """ the names of the placeholders
+        """
+        return set(self.compile()[1::2]) - set([SOURCE_PARAM])
+
+    def compile(self):
+        """ splits the source into static json chunks, at even positions, and
+        parameter names, at odd positions.
+        """
+        if self._chunks is None:
+            self._chunks = PLACEHOLDER.split(self.source)
+        return self._chunks
+
+    def mustache(self):
+        """ the source as a mustache template, each placeholder renders its params
+        json
+        """
+        return PLACEHOLDER.sub(r"{{#toJson}}\1{{/toJson}}", self.source)
+
+    def render(self, params):
+        """ the search body for `params`, as json text. the whole `_source` is
+        transferred unless `params` say otherwise.
+        """
+        if SOURCE_PARAM not in params:
+            params = dict(params)
+            params[SOURCE_PARAM] = True
+        chunks = self.compile()
+        rendered = []
+        for i, chunk in enumerate(chunks):
+            if i % 2 == 0:
+                rendered.append(chunk)
+                continue
+            try:
+                rendered.append(json.dumps(params[chunk], separators=(",", ":")))
+            except KeyError:
+                raise TemplateParamError("{0} needs the {1} parameter".format(
+                    self, chunk))
+        return "".join(rendered)
+
+
+class TemplateRegistry(object):
+    """ the search templates of a model, declared on its `MappingMeta`:
+    >>> class MappingMeta:
+    ...     search_templates = {"by_title": {"query": {"match": {"title":
+    ...         "{{title}}"}}}}
+
+    with `ES_STORED_TEMPLATES` (after `put_search_templates`) searches only send the
+    template id and params, otherwise the templates are rendered client side, with
+    the last `ES_TEMPLATE_CACHE_SIZE` renders cached.
+    """
+    def __init__(self, prefix, templates=None):
+        self.prefix = prefix
+        self.templates = {}
+        self.rendered = LRUCache(getattr(settings, "ES_TEMPLATE_CACHE_SIZE", 1000))
+        for name, body in (templates or {}).items():
+            self.register(name, body)
+
+    @property
+    def stored(self):
+        return getattr(settings, "ES_STORED_TEMPLATES", False)
+
+    def __contains__(self, name):
+        return name in self.templates
+
+    def __iter__(self):
+        return iter(self.templates.values())
+
+    def register(self, name, body):
+        self.templates[name] = SearchTemplate(name, body)
+        return self.templates[name]
+
+    def get(self, name):
+        try:
+            return self.templates[name]
+        except KeyError:
+            raise KeyError("no search template named {0}".format(name))
+
+    def template_id(self, name):
+        """ the stored script id, unique in the cluster
+        """
+        return "{0}.{1}".format(self.prefix, name)
+
+    @staticmethod
+    def source_params(params, ids_only=False):
+        """ `params` with the `_source` to transfer: with `ids_only` nothing (or just
+        the version field the hydration cache needs), otherwise the whole source
+        """
+        params = dict(params)
+        params[SOURCE_PARAM] = lean_source() if ids_only else True
+        return params
+
+    def render(self, name, params, ids_only=False):
+        """ the rendered body of template `name`, cached by its params
+        """
+        params = self.source_params(params, ids_only)
+        key = (name, json.dumps(params, sort_keys=True, separators=(",", ":")))
+        cached = self.rendered.get_many([key])
+        if key in cached:
+            return cached[key]
+        body = self.get(name).render(params)
+        self.rendered.set_many({key: body})
+        return body
+
+    def request_body(self, name, params, ids_only=False):
+        """ the body of a `_search/template` request calling the stored template
+        """
+        self.get(name)
+        return {"id": self.template_id(name),
+            "params": self.source_params(params, ids_only)}
+
+    def upload(self, elasticsearch):
+        """ stores every template in the cluster as a mustache script
+        """
+        for template in self:
+            elasticsearch.put_script(id=self.template_id(template.name),
+                body={"script": {"lang": "mustache", "source": template.mustache()}})
+        return [self.template_id(name) for name in self.templates]
@@ -19,7 +19,8 @@ os.chdir(
 setup(
     name="django-elasticmodels",
     version="0.1",
-    packages=["elasticmodels", "elasticmodels/utils", "elasticmodels/tests"],
+    packages=["elasticmodels", "elasticmodels/utils", "elasticmodels/tests",
+        "elasticmodels/management", "elasticmodels/management/commands"],
     include_package_data=True,
     license="BSD",
     description="a friendly api for adding elasticsearch capabilities to django models.",
@@ -27,5 +28,5 @@ setup(
     author="andrew young",
     email="ayoung@thewulf.org",
     test_suite="runtests.runtests",
-    install_requires=["django>=1.7", "elasticsearch>=1.6", "setuptools"],
+    install_requires=["django>=1.7", "elasticsearch>=6.8,<7", "setuptools"],
 )